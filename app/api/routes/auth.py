@@ -5,6 +5,7 @@ from services import transfer_service
 import jwt
 import uuid
 from config import Config
+from utils import run_blocking
 import jsonify
 from fastapi import Header, HTTPException, Depends, Request
 from typing import Optional
@@ -88,7 +89,7 @@ async def setYT(
         
         jwt_decode = jwt.decode(token, Config.SECRET, algorithms=["HS256"])
         
-        setup_result = setup(jwt_decode["uuid"], header)
+        setup_result = await run_blocking(setup, jwt_decode["uuid"], header)
         
         if setup_result["success"]:
             return {"status": "success", "message": setup_result["message"]}
@@ -127,7 +128,7 @@ async def authenticate(authorization: str = Header(None)):
             )
         logging.debug(f"Calling transfer_service.authenticate_services with uuid: {uuid_val}")
         manager = transfer_service.TransferManager(uuid_val)
-        success, message = manager.authenticate_services(uuid_val)
+        success, message = await run_blocking(manager.authenticate_services, uuid_val)
         logging.debug(f"Authentication result: success={success}, message={message}")
         if success:
             payload = {'uuid': uuid_val}
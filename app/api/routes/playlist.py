@@ -1,9 +1,11 @@
 
-from fastapi import APIRouter, Header
+from fastapi import APIRouter, BackgroundTasks, Header
+import asyncio
 import logging
-from services import transfer_service
+from services import playlist_cache
 import jwt
 from config import Config
+from utils import run_blocking
 from fastapi.responses import JSONResponse
 
 router = APIRouter()
@@ -11,7 +13,7 @@ router = APIRouter()
 logging.basicConfig(level=logging.DEBUG)
 
 @router.post('/get')
-async def get_playlists(authorization: str = Header(None)):
+async def get_playlists(background_tasks: BackgroundTasks, authorization: str = Header(None)):
     logging.debug(f"/playlist/get called. Authorization header: {authorization}")
     token = authorization
     try:
@@ -28,26 +30,19 @@ async def get_playlists(authorization: str = Header(None)):
         )
 
     try:
-        logging.debug(f"Creating TransferManager with uuid: {jwt_decode.get('uuid')}")
-        manager = transfer_service.TransferManager(jwt_decode.get("uuid"))
-        playlists = manager.get_spotify_playlists()
-        logging.debug(f"Retrieved {len(playlists)} playlists from Spotify.")
-
-        formatted_playlists = []
-        for playlist in playlists:
-            formatted_playlists.append({
-                'id': playlist['id'],
-                'name': playlist['name'],
-                'description': playlist.get('description', ''),
-                'tracks_count': playlist['tracks']['total'],
-                'owner': playlist['owner']['display_name'],
-                'public': playlist.get('public', False),
-                'is_liked_songs': playlist['id'] == 'liked_songs'
-            })
+        session_id = jwt_decode.get("uuid")
+        logging.debug(f"Loading playlists for uuid: {session_id}")
+        formatted_playlists = await run_blocking(playlist_cache.get_playlists, session_id, background_tasks)
 
         logging.info(f"Returning {len(formatted_playlists)} formatted playlists.")
         return {"success": "True", "playlists": formatted_playlists}
 
+    except asyncio.TimeoutError:
+        logging.warning(f"Timed out loading playlists for uuid: {session_id}")
+        return JSONResponse(
+            status_code=504,
+            content={"success": "False", "message": "Timed out loading playlists from Spotify"}
+        )
     except Exception as e:
         logging.exception(f"Failed to load playlists: {e}")
         return JSONResponse(
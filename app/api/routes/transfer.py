@@ -8,8 +8,20 @@ from fastapi import APIRouter
 from services.celery_task import transfer_playlists_task
 from typing import Optional
 import jwt
-import redis
+import gzip
+import json
+import asyncio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
 from config import Config
+from redis_client import get_async_redis
+from services.progress import (
+    read_progress_async, read_events_after_async, latest_event_id_async, progress_hub, stream_id,
+    STREAM_ID, TERMINAL_STATUSES
+)
+from utils import run_blocking
+from log_sink import read_session_logs
+from services.journal import journal_chunk_count_async, iter_journal_chunks_async
 router = APIRouter()
 app = FastAPI()
 
@@ -36,7 +48,8 @@ async def start_transfer( body: TransferBody,  authorization: Optional[str] = He
         raise HTTPException(status_code=401, detail="Invalid token")
 
     try:
-        task = transfer_playlists_task.delay(
+        task = await run_blocking(
+            transfer_playlists_task.delay,
             session_id=session_i,
             selected_playlist_ids=body.playlist_ids,
             options=body.options
@@ -50,35 +63,159 @@ async def get_status(token: str):
     jwt_decode = jwt.decode(token, Config.SECRET, algorithms=["HS256"])
     session_id = jwt_decode.get("uuid")
     
-    r = redis.Redis.from_url(Config.REDIS)
-    
-    task_status = r.get(f"task_status_{session_id}")
-    if task_status and task_status.decode('utf-8') == 'cancelled':
-        return {"session_id": session_id, "status": "cancelled", "progress": 0}
-    
-    if task_status and task_status.decode('utf-8') == 'failed':
-        return {"session_id": session_id, "status": "failed", "progress": 0}
-    
-    
-    result = r.get(session_id)
-    if result is None:
+    state = await read_progress_async(session_id)
+    if not state:
         return {"session_id": session_id, "status": "not_found", "progress": 0}
 
+    task_status = state.get('status')
+    if task_status in ('cancelled', 'failed'):
+        return {"session_id": session_id, "status": task_status, "progress": 0, "message": state.get('message', '')}
+
     try:
-        progress = float(result.decode("utf-8"))
-        
-        if task_status and task_status.decode('utf-8') == 'completed':
-            status = "completed"
-        elif progress >= 100:
-            status = "completed"
-        elif task_status and task_status.decode('utf-8') == 'running':
-            status = "in_progress"
-        else:
-            status = "in_progress"
-            
-        return {"session_id": session_id, "status": status, "progress": progress}
-    except (ValueError, AttributeError):
-        return {"session_id": session_id, "status": "invalid_value", "progress": result}
+        progress = float(state.get('progress', 0))
+    except ValueError:
+        return {"session_id": session_id, "status": "invalid_value", "progress": state.get('progress')}
+
+    if task_status == 'completed' or progress >= 100:
+        status = "completed"
+    else:
+        status = "in_progress"
+
+    return {
+        "session_id": session_id,
+        "status": status,
+        "progress": progress,
+        "stage": state.get('stage', ''),
+        "processed": int(state.get('processed', 0)),
+        "total": int(state.get('total', 0)),
+        "total_estimated": state.get('total_estimated') == '1',
+        "successful": int(state.get('successful', 0)),
+        "failed": int(state.get('failed', 0)),
+        "current_track": state.get('current_track', ''),
+        "eta_seconds": state.get('eta_seconds') or None
+    }
+
+
+@router.get("/stream/{token}")
+async def stream_status(
+    token: str,
+    request: Request,
+    last_event_id: Optional[str] = None,
+    last_event_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-sent events for a transfer: progress snapshots, per-track outcomes and the final status.
+
+    Reconnecting clients resume after ``Last-Event-ID`` (header, or the
+    ``last_event_id`` query parameter); a fresh connection starts with the
+    current snapshot. ``/status`` stays available as a polling fallback.
+    """
+    try:
+        session_id = jwt.decode(token, Config.SECRET, algorithms=["HS256"]).get("uuid")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    resume_from = last_event_header or last_event_id
+    # Checked before the response starts; a bad ID would otherwise only fail mid-stream.
+    if resume_from and not STREAM_ID.fullmatch(resume_from):
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    def format_event(event_type, data, event_id=None):
+        lines = [f"id: {event_id}"] if event_id else []
+        lines += [f"event: {event_type}", f"data: {json.dumps(data)}"]
+        return "\n".join(lines) + "\n\n"
+
+    async def events():
+        # Subscribe before reading anything so events published meanwhile are queued.
+        queue = await progress_hub.subscribe(session_id)
+        try:
+            last_id = resume_from
+            if not last_id:
+                # Take the position before the snapshot so nothing in between is missed.
+                last_id = await latest_event_id_async(session_id)
+                state = await read_progress_async(session_id)
+                yield format_event("snapshot", state or {"status": "not_found"}, last_id)
+                if state.get('status') in TERMINAL_STATUSES:
+                    return
+
+            batch = await read_events_after_async(session_id, last_id)
+            while True:
+                for event_id, event in batch:
+                    # Catch-up reads and the hub can overlap; IDs only move forward.
+                    if stream_id(event_id) <= stream_id(last_id):
+                        continue
+                    last_id = event_id
+                    yield format_event(event.pop('type', 'progress'), event, event_id)
+                    if event.get('status') in TERMINAL_STATUSES:
+                        return
+
+                if await request.is_disconnected():
+                    return
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=Config.PROGRESS_STREAM_BLOCK_MS / 1000.0)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    batch = []
+                    continue
+                batch = await read_events_after_async(session_id, last_id) if item is None else [item]
+        finally:
+            progress_hub.unsubscribe(session_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/logs/{token}")
+async def get_logs(token: str, after: str = "-", count: int = 200):
+    """Page through the session's capped log stream; pass the last returned id as ``after``."""
+    try:
+        session_id = jwt.decode(token, Config.SECRET, algorithms=["HS256"]).get("uuid")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if after != "-" and not STREAM_ID.fullmatch(after):
+        raise HTTPException(status_code=400, detail="Invalid after id")
+
+    entries = await run_blocking(read_session_logs, session_id, after, max(1, min(count, 1000)))
+    return {
+        "session_id": session_id,
+        "logs": [dict(record, id=entry_id) for entry_id, record in entries],
+        "next": entries[-1][0] if entries else after
+    }
+
+
+@router.get("/journal/{token}")
+async def download_journal(token: str, request: Request, start: int = 0, chunks: Optional[int] = None):
+    """Stream the per-track journal as NDJSON, ``chunks`` stored chunks at a time from ``start``.
+
+    Clients that accept gzip get the stored chunks verbatim; the
+    ``X-Journal-Chunks`` header carries the total for paging.
+    """
+    try:
+        session_id = jwt.decode(token, Config.SECRET, algorithms=["HS256"]).get("uuid")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not session_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    total = await journal_chunk_count_async(session_id)
+    start = max(start, 0)
+    stop = total if chunks is None else min(total, start + max(chunks, 0))
+    headers = {"X-Journal-Chunks": str(total), "Cache-Control": "no-store"}
+    passthrough = "gzip" in request.headers.get("accept-encoding", "")
+    if passthrough:
+        headers["Content-Encoding"] = "gzip"
+
+    async def body():
+        async for chunk in iter_journal_chunks_async(session_id, start, stop):
+            yield chunk if passthrough else gzip.decompress(chunk)
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
 
 
 @router.post("/cancel")
@@ -93,8 +230,8 @@ async def cancel_transfer(authorization: Optional[str] = Header(None)):
         if not session_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        r = redis.Redis.from_url(Config.REDIS)
-        r.set(f"cancel_{session_id}", "true", ex=300)  
+        r = get_async_redis()
+        await r.set(f"cancel_{session_id}", "true", ex=Config.PROGRESS_TTL)  
         
         return {"message": "Cancellation requested", "session_id": session_id}
         
@@ -113,8 +250,8 @@ async def cancel_transfer_by_token(token: str):
         if not session_id:
             raise HTTPException(status_code=401, detail="Invalid token: session_id missing")
         
-        r = redis.Redis.from_url(Config.REDIS)
-        r.set(f"cancel_{session_id}", "true", ex=300) 
+        r = get_async_redis()
+        await r.set(f"cancel_{session_id}", "true", ex=Config.PROGRESS_TTL) 
 
         return {"message": "Cancellation done", "session_id": session_id, "success": "True"}
 
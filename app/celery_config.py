@@ -12,6 +12,8 @@ celery = Celery(
 celery.conf.update(
     task_track_started=True,
     result_expires=3600,
+    worker_prefetch_multiplier=1,
+    broker_transport_options={"visibility_timeout": Config.CELERY_VISIBILITY_TIMEOUT},
     broker_use_ssl={"ssl_cert_reqs": ssl.CERT_NONE},
     redis_backend_use_ssl={"ssl_cert_reqs": ssl.CERT_NONE}
 )
@@ -10,7 +10,14 @@ class Config:
     SECRET = os.getenv('secret')
     REDIS_URL = os.getenv('REDIS')
     REDIS = os.getenv('REDIS_URL')
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 5))
     YOUTUBE_MUSIC_HEADERS_FILE = "headers"
+
+    API_THREADPOOL_SIZE = int(os.getenv('API_THREADPOOL_SIZE', 32))
+    API_BLOCKING_TIMEOUT = float(os.getenv('API_BLOCKING_TIMEOUT', 30))
     
    
     CACHE_DIR = '.cache'
@@ -18,12 +25,101 @@ class Config:
     TRANSFER_LOG_FILE = 'transfer_log.txt'
     
     MAX_SEARCH_RESULTS = 5
+    SEARCH_EARLY_EXIT_SCORE = float(os.getenv('SEARCH_EARLY_EXIT_SCORE', 0.9))
+    DURATION_TOLERANCE_SECONDS = float(os.getenv('DURATION_TOLERANCE_SECONDS', 15))
+    DURATION_TOLERANCE_RATIO = float(os.getenv('DURATION_TOLERANCE_RATIO', 0.1))
+    DURATION_WEIGHT = float(os.getenv('DURATION_WEIGHT', 0.2))
     SIMILARITY_THRESHOLD = 0.8
     SIMILARITY_AI = 0.4
-    
+    SIMILARITY_TITLE_WEIGHT = float(os.getenv('SIMILARITY_TITLE_WEIGHT', 0.7))
+    SIMILARITY_ARTIST_WEIGHT = float(os.getenv('SIMILARITY_ARTIST_WEIGHT', 0.3))
+
+    MATCH_CACHE_SIZE = int(os.getenv('MATCH_CACHE_SIZE', 100000))
+    MATCH_CACHE_TTL = int(os.getenv('MATCH_CACHE_TTL', 7 * 24 * 3600))
+    MATCH_CACHE_MISS_TTL = int(os.getenv('MATCH_CACHE_MISS_TTL', 6 * 3600))
+    MATCH_CACHE_LOCAL_TTL = int(os.getenv('MATCH_CACHE_LOCAL_TTL', 3600))
+
+    AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 50000))
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 3600))
+    # AI_TIMEOUT bounds a whole lookup once it is running; it must outlast the
+    # LLM client's own worst case of AI_LLM_TIMEOUT * (AI_LLM_MAX_RETRIES + 1).
+    AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', 30))
+    AI_LLM_TIMEOUT = float(os.getenv('AI_LLM_TIMEOUT', 10))
+    AI_LLM_MAX_RETRIES = int(os.getenv('AI_LLM_MAX_RETRIES', 1))
+    AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 4))
+    AI_FALLBACK_WORKERS = int(os.getenv('AI_FALLBACK_WORKERS', 4))
+    AI_FALLBACK_MAX_CALLS = int(os.getenv('AI_FALLBACK_MAX_CALLS', 200))
+    AI_FALLBACK_TIME_BUDGET = float(os.getenv('AI_FALLBACK_TIME_BUDGET', 600))
+
+    YTMUSIC_REGISTRY_SIZE = int(os.getenv('YTMUSIC_REGISTRY_SIZE', 1000))
+    YTMUSIC_REGISTRY_TTL = int(os.getenv('YTMUSIC_REGISTRY_TTL', 1800))
+
+    PLAYLIST_WRITE_CHUNK_SIZE = int(os.getenv('PLAYLIST_WRITE_CHUNK_SIZE', 200))
+    TRANSFER_MAX_WORKERS = int(os.getenv('TRANSFER_MAX_WORKERS', 8))
+    TRANSFER_QUEUE_SIZE = int(os.getenv('TRANSFER_QUEUE_SIZE', 500))
+
+    SPOTIFY_PAGE_CONCURRENCY = int(os.getenv('SPOTIFY_PAGE_CONCURRENCY', 8))
+    SPOTIFY_REGISTRY_SIZE = int(os.getenv('SPOTIFY_REGISTRY_SIZE', 1000))
+    SPOTIFY_REGISTRY_TTL = int(os.getenv('SPOTIFY_REGISTRY_TTL', 1800))
+    SPOTIFY_REFRESH_AHEAD = int(os.getenv('SPOTIFY_REFRESH_AHEAD', 300))
+    SPOTIFY_REFRESH_WORKERS = int(os.getenv('SPOTIFY_REFRESH_WORKERS', 2))
+    SPOTIFY_HTTP_POOL_SIZE = int(os.getenv('SPOTIFY_HTTP_POOL_SIZE', 32))
+
+    RATE_LIMITS = {
+        'ytmusic': {
+            'rate': float(os.getenv('YTMUSIC_RATE', 20)),
+            'burst': float(os.getenv('YTMUSIC_BURST', 40)),
+            'session_rate': float(os.getenv('YTMUSIC_SESSION_RATE', 5)),
+            'session_burst': float(os.getenv('YTMUSIC_SESSION_BURST', 10)),
+        },
+        'spotify': {
+            'rate': float(os.getenv('SPOTIFY_RATE', 30)),
+            'burst': float(os.getenv('SPOTIFY_BURST', 60)),
+            'session_rate': float(os.getenv('SPOTIFY_SESSION_RATE', 10)),
+            'session_burst': float(os.getenv('SPOTIFY_SESSION_BURST', 20)),
+        },
+    }
+    RATE_LIMIT_MAX_WAIT_MS = int(os.getenv('RATE_LIMIT_MAX_WAIT_MS', 2000))
+    RATE_LIMIT_BACKOFF_BASE_MS = int(os.getenv('RATE_LIMIT_BACKOFF_BASE_MS', 500))
+    RATE_LIMIT_BACKOFF_MAX_MS = int(os.getenv('RATE_LIMIT_BACKOFF_MAX_MS', 30000))
+    RATE_LIMIT_BACKOFF_DECAY = int(os.getenv('RATE_LIMIT_BACKOFF_DECAY', 60))
+    UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', 5))
+
+    PLAYLIST_CACHE_FRESH = int(os.getenv('PLAYLIST_CACHE_FRESH', 60))
+    PLAYLIST_CACHE_TTL = int(os.getenv('PLAYLIST_CACHE_TTL', 24 * 3600))
+    PLAYLIST_CACHE_REFRESH_LOCK = int(os.getenv('PLAYLIST_CACHE_REFRESH_LOCK', 30))
+
+    CHECKPOINT_TTL = int(os.getenv('CHECKPOINT_TTL', 48 * 3600))
+    JOURNAL_TTL = int(os.getenv('JOURNAL_TTL', 7 * 24 * 3600))
+    JOURNAL_CHUNK_SIZE = int(os.getenv('JOURNAL_CHUNK_SIZE', 500))
+    CHECKPOINT_FLUSH_EVERY = int(os.getenv('CHECKPOINT_FLUSH_EVERY', 50))
+    CELERY_VISIBILITY_TIMEOUT = int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 6 * 3600))
+
+    PROGRESS_MIN_INTERVAL_MS = int(os.getenv('PROGRESS_MIN_INTERVAL_MS', 500))
+    PROGRESS_TTL = int(os.getenv('PROGRESS_TTL', 6 * 3600))
+    PROGRESS_STREAM_MAXLEN = int(os.getenv('PROGRESS_STREAM_MAXLEN', 1000))
+    PROGRESS_STREAM_BLOCK_MS = int(os.getenv('PROGRESS_STREAM_BLOCK_MS', 3000))
+    PROGRESS_STREAM_QUEUE_SIZE = int(os.getenv('PROGRESS_STREAM_QUEUE_SIZE', 256))
+
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    SPOTIFY_CACHE_DIR = os.path.join(BASE_DIR, "spotify_caches")
-    os.makedirs(SPOTIFY_CACHE_DIR, exist_ok=True)
+
+    SESSION_STORE_BACKEND = os.getenv('SESSION_STORE_BACKEND', 'redis')
+    SESSION_STORE_DIR = os.getenv('SESSION_STORE_DIR', os.path.join(BASE_DIR, "sessions"))
+    SESSION_STORE_KEY = os.getenv('SESSION_STORE_KEY')
+    SESSION_TTL = int(os.getenv('SESSION_TTL', 30 * 24 * 3600))
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 1024))
+    SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL', 60))
+
+    LOG_DIR = os.getenv('LOG_DIR', os.path.join(BASE_DIR, "logs"))
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    LOG_ROTATE_INTERVAL = int(os.getenv('LOG_ROTATE_INTERVAL', 24 * 3600))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 200))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 1.0))
+    LOG_CONSOLE_LEVEL = os.getenv('LOG_CONSOLE_LEVEL', 'WARNING')
+    LOG_STREAM_MAXLEN = int(os.getenv('LOG_STREAM_MAXLEN', 2000))
+    LOG_STREAM_TTL = int(os.getenv('LOG_STREAM_TTL', 24 * 3600))
 
     @classmethod
     def validate(cls):
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from config import Config
+from redis_client import get_redis
+
+_STOP = object()
+LOGGER_NAME = "ytify.transfer"
+
+
+def logs_key(session_id):
+    return f"logs:{session_id}"
+
+
+class _ContextDefaults(logging.Filter):
+    """Fill in the session/playlist tags so the formatter never sees a bare record."""
+
+    def filter(self, record):
+        if not getattr(record, 'session_id', None):
+            record.session_id = "-"
+        if not getattr(record, 'playlist', None):
+            record.playlist = "-"
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never block the caller: when the queue is full the record is counted and dropped."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """Rotates on size or age, and writes a whole batch of records before one flush."""
+
+    def __init__(self, filename, max_bytes, backup_count, rotate_interval):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.rotate_interval = rotate_interval
+        self._rollover_at = time.time() + rotate_interval
+
+    def shouldRollover(self, record):
+        if self.rotate_interval and time.time() >= self._rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = time.time() + self.rotate_interval
+
+    def emit_batch(self, records):
+        try:
+            for record in records:
+                if self.shouldRollover(record):
+                    self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(self.format(record) + self.terminator)
+            if self.stream is not None:
+                self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+
+
+class RedisStreamHandler(logging.Handler):
+    """Appends session-tagged records to capped ``logs:{session_id}`` streams, one pipeline per batch."""
+
+    def __init__(self, maxlen, ttl, level=logging.INFO):
+        super().__init__(level)
+        self.maxlen = maxlen
+        self.ttl = ttl
+
+    def emit_batch(self, records):
+        records = [r for r in records if r.session_id != "-"]
+        if not records:
+            return
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            keys = set()
+            for record in records:
+                key = logs_key(record.session_id)
+                keys.add(key)
+                pipe.xadd(key, {'data': json.dumps({
+                    'ts': record.created,
+                    'level': record.levelname,
+                    'playlist': None if record.playlist == "-" else record.playlist,
+                    'message': record.getMessage()
+                })}, maxlen=self.maxlen, approximate=True)
+            for key in keys:
+                pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception:
+            # Logging must never take a transfer down; the file still has the records.
+            pass
+
+
+class LogSink:
+    """Queue-backed logging shared by every caller in a process.
+
+    Callers only enqueue; a single background thread drains the queue in
+    batches (whatever is queued, up to LOG_BATCH_SIZE) and hands each batch to a per-process rotating file,
+    the per-session Redis streams and, above LOG_CONSOLE_LEVEL, stderr.
+    The thread is (re)started lazily so forked Celery workers get their own.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._handlers = []
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+            self._handlers = self._build_handlers()
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+            queue_handler = _DroppingQueueHandler(self._queue)
+            queue_handler.addFilter(_ContextDefaults())
+            self.logger.addHandler(queue_handler)
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _build_handlers(self):
+        formatter = logging.Formatter(
+            "[%(asctime)s] %(levelname)s [%(session_id)s/%(playlist)s] %(message)s",
+            "%Y-%m-%d %H:%M:%S"
+        )
+        os.makedirs(Config.LOG_DIR, exist_ok=True)
+        root, ext = os.path.splitext(os.path.basename(Config.TRANSFER_LOG_FILE))
+        file_handler = BatchRotatingFileHandler(
+            os.path.join(Config.LOG_DIR, f"{root}.{os.getpid()}{ext}"),
+            Config.LOG_MAX_BYTES,
+            Config.LOG_BACKUP_COUNT,
+            Config.LOG_ROTATE_INTERVAL
+        )
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setLevel(Config.LOG_CONSOLE_LEVEL)
+        handlers = [file_handler, RedisStreamHandler(Config.LOG_STREAM_MAXLEN, Config.LOG_STREAM_TTL), console_handler]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        return handlers
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=Config.LOG_FLUSH_INTERVAL)]
+            except queue.Empty:
+                continue
+            while len(batch) < Config.LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(record is _STOP for record in batch)
+            self._dispatch([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _dispatch(self, records):
+        if not records:
+            return
+        for handler in self._handlers:
+            selected = [r for r in records if r.levelno >= handler.level]
+            if not selected:
+                continue
+            emit_batch = getattr(handler, 'emit_batch', None)
+            if emit_batch is not None:
+                emit_batch(selected)
+            else:
+                for record in selected:
+                    handler.handle(record)
+
+    def log(self, message, level="INFO", session_id=None, playlist=None):
+        self._ensure_started()
+        levelno = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if not isinstance(levelno, int):
+            levelno = logging.INFO
+        self.logger.log(levelno, message, extra={'session_id': session_id, 'playlist': playlist})
+
+    def stop(self):
+        """Drain whatever is queued and close the handlers (registered with atexit)."""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+        for handler in self._handlers:
+            handler.close()
+        self._pid = None
+
+
+log_sink = LogSink()
+atexit.register(log_sink.stop)
+
+
+def read_session_logs(session_id, after="-", count=200):
+    """Per-session records from the capped Redis stream, oldest first, as (id, record) pairs."""
+    start = after if after == "-" else f"({after}"
+    entries = get_redis().xrange(logs_key(session_id), min=start, max="+", count=count)
+    return [(entry_id.decode('utf-8'), json.loads(fields[b'data'])) for entry_id, fields in entries]
@@ -4,7 +4,8 @@ from api.routes import transfer, auth, playlist
 from fastapi import APIRouter, Request
 from spotipy.oauth2 import SpotifyOAuth
 from config import Config
-import os
+from utils import run_blocking
+from services.session_store import SessionCacheHandler
 
 
 from fastapi.responses import HTMLResponse
@@ -30,18 +31,15 @@ async def spotify_callback(request: Request):
 
     session_id = state 
 
-    os.makedirs(Config.SPOTIFY_CACHE_DIR, exist_ok=True)
-    cache_path = os.path.join(Config.SPOTIFY_CACHE_DIR, f"spotify_cache_{session_id}.json")
-
     sp_oauth = SpotifyOAuth(
         client_id=Config.SPOTIFY_CLIENT_ID,
         client_secret=Config.SPOTIFY_CLIENT_SECRET,
         redirect_uri=Config.SPOTIFY_REDIRECT_URI,
         scope="user-library-read playlist-read-private playlist-read-collaborative",
-        cache_path=cache_path,
+        cache_handler=SessionCacheHandler(session_id),
     )
 
-    token_info = sp_oauth.get_access_token(code)
+    token_info = await run_blocking(sp_oauth.get_access_token, code)
     if token_info:
       
         
@@ -0,0 +1,71 @@
+import threading
+import redis
+import redis.asyncio as aioredis
+from config import Config
+
+_pool = None
+_async_pool = None
+_stream_pool = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    """Lazily create the process-wide connection pool shared by the API and Celery workers."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = redis.ConnectionPool.from_url(
+                    Config.REDIS,
+                    max_connections=Config.REDIS_MAX_CONNECTIONS,
+                    health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+                    socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+                    socket_keepalive=True
+                )
+    return _pool
+
+
+def get_redis():
+    """Return a client bound to the shared pool; cheap enough to call per operation."""
+    return redis.Redis(connection_pool=get_pool())
+
+
+def pipeline(transaction=False):
+    """Pipeline on the shared pool for batching several commands into one round-trip."""
+    return get_redis().pipeline(transaction=transaction)
+
+
+def get_async_redis():
+    """Async client for the API's event loop, backed by its own lazily created pool."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = aioredis.ConnectionPool.from_url(
+            Config.REDIS,
+            max_connections=Config.REDIS_MAX_CONNECTIONS,
+            health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+            socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True
+        )
+    return aioredis.Redis(connection_pool=_async_pool)
+
+
+def get_async_stream_redis():
+    """Async client for long blocking reads (XREAD BLOCK), kept off the request pool.
+
+    Its socket timeout outlasts PROGRESS_STREAM_BLOCK_MS so a quiet block
+    isn't mistaken for a dead connection.
+    """
+    global _stream_pool
+    if _stream_pool is None:
+        _stream_pool = aioredis.BlockingConnectionPool.from_url(
+            Config.REDIS,
+            max_connections=2,
+            timeout=Config.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+            socket_timeout=Config.PROGRESS_STREAM_BLOCK_MS / 1000.0 + Config.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_keepalive=True
+        )
+    return aioredis.Redis(connection_pool=_stream_pool)
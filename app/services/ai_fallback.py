@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from redis_client import get_redis
+from utils import log_message
+
+
+def budget_limits(options=None):
+    """Per-transfer (max_calls, time_budget); options can lower the configured caps, never raise them."""
+    options = options or {}
+    return (
+        min(int(options.get('ai_fallback_max_calls', Config.AI_FALLBACK_MAX_CALLS)), Config.AI_FALLBACK_MAX_CALLS),
+        min(float(options.get('ai_fallback_time_budget', Config.AI_FALLBACK_TIME_BUDGET)), Config.AI_FALLBACK_TIME_BUDGET)
+    )
+
+
+def _calls_key(session_id):
+    return f"ai_calls:{session_id}"
+
+
+def _deadline_key(session_id):
+    return f"ai_deadline:{session_id}"
+
+
+def start_budget(session_id, options=None):
+    """Reset a transfer's session-wide budget when it is dispatched; the time budget starts now."""
+    _, time_budget = budget_limits(options)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.delete(_calls_key(session_id))
+    pipe.set(_deadline_key(session_id), time.time() + time_budget, ex=Config.CELERY_VISIBILITY_TIMEOUT)
+    pipe.execute()
+
+
+class AIFallbackStage:
+    """Runs AI fallback lookups off the main matching pass, within a per-transfer budget.
+
+    ``submit`` returns a future, or None once the call budget is spent or the
+    time budget has run out. With ``session_id`` the budget is shared by
+    every subtask of the transfer through ``ai_calls:{session_id}`` and the
+    deadline set by ``start_budget``; otherwise (or while Redis is
+    unavailable) it is counted locally from the first fallback.
+    """
+
+    def __init__(self, resolve, max_calls=None, time_budget=None, workers=None, session_id=None):
+        self.resolve = resolve
+        self.max_calls = Config.AI_FALLBACK_MAX_CALLS if max_calls is None else max_calls
+        self.time_budget = Config.AI_FALLBACK_TIME_BUDGET if time_budget is None else time_budget
+        self.session_id = session_id
+        self.calls = 0
+        self.skipped = 0
+        self.deadline = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.AI_FALLBACK_WORKERS,
+            thread_name_prefix="ai-fallback"
+        )
+
+    def _claim_shared(self, now):
+        """Take one call from the session's budget; returns False when it is spent."""
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(_calls_key(self.session_id))
+        pipe.expire(_calls_key(self.session_id), Config.CELERY_VISIBILITY_TIMEOUT)
+        # Only a transfer that wasn't dispatched through start_budget gets its deadline here.
+        pipe.set(_deadline_key(self.session_id), time.time() + self.time_budget, nx=True, ex=Config.CELERY_VISIBILITY_TIMEOUT)
+        pipe.get(_deadline_key(self.session_id))
+        calls, _, _, deadline = pipe.execute()
+        self.deadline = now + (float(deadline) - time.time())
+        return calls <= self.max_calls and now < self.deadline
+
+    def submit(self, *args):
+        with self._lock:
+            now = time.monotonic()
+            allowed = None
+            if self.session_id is not None:
+                try:
+                    allowed = self._claim_shared(now)
+                except Exception as e:
+                    log_message(f"AI fallback budget unavailable, counting locally: {e}", "WARNING", session_id=self.session_id)
+            if allowed is None:
+                if self.deadline is None:
+                    self.deadline = now + self.time_budget
+                allowed = self.calls < self.max_calls and now < self.deadline
+            if not allowed:
+                self.skipped += 1
+                return None
+            self.calls += 1
+        return self._executor.submit(self.resolve, *args)
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return self.time_budget
+        return max(0.0, self.deadline - time.monotonic())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from config import Config
+from redis_client import get_redis
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MatchCache:
+    """Spotify track -> YouTube Music videoId matches, shared by every worker through Redis.
+
+    Entries live under ``match:{spotify_id}`` with MATCH_CACHE_TTL (misses
+    get the shorter MATCH_CACHE_MISS_TTL, so tracks known to be unavailable
+    don't trigger a search and an AI fallback on every transfer). Reads go
+    through a short-lived in-process tier first. Redis errors count as a
+    cache miss; they never fail a transfer.
+    """
+
+    NOT_FOUND = {'videoId': None, 'score': 0, 'mode': None}
+
+    def __init__(self, maxsize=None, ttl=None, miss_ttl=None, local_ttl=None):
+        self.ttl = Config.MATCH_CACHE_TTL if ttl is None else ttl
+        self.miss_ttl = Config.MATCH_CACHE_MISS_TTL if miss_ttl is None else miss_ttl
+        self._cache = TTLCache(
+            Config.MATCH_CACHE_SIZE if maxsize is None else maxsize,
+            Config.MATCH_CACHE_LOCAL_TTL if local_ttl is None else local_ttl
+        )
+
+    @staticmethod
+    def _key(spotify_id):
+        return f"match:{spotify_id}"
+
+    def _local_ttl(self, ttl):
+        return min(self._cache.ttl, ttl)
+
+    def get(self, spotify_id):
+        """Return the cached match dict, NOT_FOUND for a cached miss, or None if unknown."""
+        if not spotify_id:
+            return None
+        cached = self._cache.get(spotify_id)
+        if cached is not None:
+            return cached
+        try:
+            raw = get_redis().get(self._key(spotify_id))
+            match = json.loads(raw) if raw is not None else None
+        except Exception:
+            return None
+        if match is None:
+            return None
+        if not match.get('videoId'):
+            self._cache.set(spotify_id, self.NOT_FOUND, ttl=self._local_ttl(self.miss_ttl))
+            return self.NOT_FOUND
+        self._cache.set(spotify_id, match)
+        return match
+
+    def _store(self, spotify_id, match, ttl):
+        self._cache.set(spotify_id, match, ttl=self._local_ttl(ttl))
+        try:
+            get_redis().set(self._key(spotify_id), json.dumps(match), ex=ttl)
+        except Exception:
+            # The local tier still has it; other workers will just search again.
+            pass
+
+    def set_match(self, spotify_id, video_id, score, mode):
+        if not spotify_id:
+            return
+        self._store(spotify_id, {'videoId': video_id, 'score': score, 'mode': mode}, self.ttl)
+
+    def set_not_found(self, spotify_id):
+        if not spotify_id:
+            return
+        self._store(spotify_id, self.NOT_FOUND, self.miss_ttl)
+
+    def invalidate(self, spotify_id):
+        self._cache.delete(spotify_id)
+        try:
+            get_redis().delete(self._key(spotify_id))
+        except Exception:
+            pass
+
+
+match_cache = MatchCache()
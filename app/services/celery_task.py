@@ -1,50 +1,134 @@
 from celery_config import celery
-from services import transfer_service
+from celery import chord
+from services import transfer_service, playlist_cache
 from services.transfer_service import TaskCancelledException
+from services.checkpoint import TransferCheckpoint
+from services.journal import TransferJournal
+from services.ai_fallback import start_budget
 import logging
+from datetime import datetime
 from celery.utils.log import get_task_logger
-import redis
-from config import Config
+from services.progress import ProgressPublisher
 
 logger = get_task_logger(__name__)
 
 @celery.task(bind=True)
 def transfer_playlists_task(self, session_id, selected_playlist_ids, options=None):
+    """Fan a transfer out into one subtask per playlist and merge them in a chord callback."""
     try:
-        r = redis.Redis.from_url(Config.REDIS)
-        r.set(f"task_status_{session_id}", "running", ex=3600)  
-        
+        progress = ProgressPublisher(session_id)
+        progress.start()
+        TransferJournal(session_id).clear()
+        start_budget(session_id, options)
+
         manager = transfer_service.TransferManager(session_id)
-        
+
         auth_success, auth_message = manager.authenticate_services(session_id)
         if not auth_success:
-            r.set(f"task_status_{session_id}", "failed")
+            progress.set_status("failed", message=auth_message)
             return {"status": "failed", "message": auth_message}
-        
+
         all_playlists = manager.get_spotify_playlists()
         selected_playlists = [p for p in all_playlists if p['id'] in selected_playlist_ids]
         logger.debug(f"Selected {len(selected_playlists)} playlists out of {len(all_playlists)}")
 
-        try:
-            report = manager.transfer_playlists(session_id, selected_playlists, options, task=self)
-            
-            r.set(f"task_status_{session_id}", "completed")
-            return {"status": "completed", "report": report}
-            
-        except TaskCancelledException:
-            r.set(f"task_status_{session_id}", "cancelled")
-            r.set(session_id, 0) 
-            logger.info(f"Transfer task cancelled for session {session_id}")
-            return {"status": "cancelled", "message": "Transfer was cancelled by user"}
-            
-        except Exception as e:
-            logger.error(f"Error occurred while transferring playlists: {e}")
-            r.set(f"task_status_{session_id}", "failed")
-            self.update_state(state="FAILURE", meta={"error": str(e)})
-            return {"status": "failed", "error": str(e)}
+        if not selected_playlists:
+            progress.set_status("completed", progress=100)
+            return {"status": "completed", "report": _merge_reports([])}
+
+        progress.set_status(
+            "running",
+            stage="dispatching",
+            total=sum(p.get('tracks', {}).get('total', 0) or 0 for p in selected_playlists)
+        )
+
+        # Destinations are settled once here so subtasks share one library lookup
+        # and same-named playlists merge instead of racing to create duplicates.
+        destinations = manager.resolve_destinations(session_id, selected_playlists, options)
+
+        callback = finalize_transfer_task.s(session_id)
+        header = [
+            transfer_playlist_subtask.s(
+                session_id, playlist, options,
+                destination=destinations.get(playlist['name'])
+            )
+            for playlist in selected_playlists
+        ]
+        result = chord(header)(callback)
+        return {"status": "dispatched", "playlists": len(selected_playlists), "callback_id": result.id}
 
     except Exception as e:
         logger.exception(f"Transfer task failed: {e}")
-        r = redis.Redis.from_url(Config.REDIS)
-        r.set(f"task_status_{session_id}", "failed")
-        return {"status": "failed", "error": str(e)}
\ No newline at end of file
+        ProgressPublisher(session_id).set_status("failed", message=str(e))
+        return {"status": "failed", "error": str(e)}
+
+
+@celery.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def transfer_playlist_subtask(self, session_id, playlist, options=None, destination=None):
+    """Transfer a single playlist, reporting into the session's shared progress hash."""
+    try:
+        manager = transfer_service.TransferManager(session_id, shared_progress=True, progress_part=playlist['id'])
+        manager._check_cancellation(session_id, self)
+
+        auth_success, auth_message = manager.authenticate_services(session_id)
+        if not auth_success:
+            return {"status": "failed", "playlist": playlist['name'], "error": auth_message}
+
+        destinations = {playlist['name']: destination} if destination else None
+        report = manager.transfer_playlists(session_id, [playlist], options, task=self, destinations=destinations)
+        return {"status": "completed", "playlist": playlist['name'], "report": report}
+
+    except TaskCancelledException:
+        logger.info(f"Transfer of '{playlist['name']}' cancelled for session {session_id}")
+        return {"status": "cancelled", "playlist": playlist['name']}
+
+    except Exception as e:
+        logger.exception(f"Transfer of '{playlist['name']}' failed: {e}")
+        return {"status": "failed", "playlist": playlist['name'], "error": str(e)}
+
+
+@celery.task
+def finalize_transfer_task(results, session_id):
+    """Chord callback: merge the per-playlist results and record the final session status."""
+    progress = ProgressPublisher(session_id)
+    statuses = [r.get('status') for r in results]
+
+    if 'cancelled' in statuses:
+        status = "cancelled"
+    elif statuses and all(s == 'failed' for s in statuses):
+        status = "failed"
+    else:
+        status = "completed"
+
+    report = _merge_reports(results)
+    if status == "completed":
+        progress.set_status("completed", progress=100, stage="complete")
+        TransferCheckpoint(session_id).clear()
+        playlist_cache.invalidate(session_id)
+    elif status == "cancelled":
+        progress.set_status("cancelled", progress=0)
+    else:
+        errors = '; '.join(r.get('error', '') for r in results if r.get('error'))
+        progress.set_status("failed", message=errors)
+
+    return {"status": status, "report": report}
+
+
+def _merge_reports(results):
+    """Summary-only report for the result backend; per-track detail is in the session journal."""
+    summary = {'total_tracks': 0, 'successful_transfers': 0, 'failed_transfers': 0, 'skipped_tracks': 0}
+    playlists, journal_entries = [], 0
+    for result in results:
+        playlists.append({k: result.get(k) for k in ('playlist', 'status', 'error') if result.get(k) is not None})
+        report = result.get('report') or {}
+        for key in summary:
+            summary[key] += report.get('summary', {}).get(key, 0)
+        journal_entries += report.get('journal_entries', 0)
+
+    summary['success_rate'] = (summary['successful_transfers'] / max(summary['total_tracks'], 1)) * 100
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'summary': summary,
+        'playlists': playlists,
+        'journal_entries': journal_entries
+    }
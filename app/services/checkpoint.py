@@ -0,0 +1,116 @@
+import json
+import threading
+from config import Config
+from redis_client import get_redis
+
+
+class TransferCheckpoint:
+    """Per-track transfer state persisted per session and playlist so a re-run resumes.
+
+    ``checkpoint:{session_id}:{playlist_id}`` maps a track's position to its
+    resolved match (``v``: videoId or "" for not found) and whether it has been
+    written (``w``). Created destination playlists are kept in
+    ``checkpoint:{session_id}:destinations``. Updates are buffered and sent in
+    pipelined batches.
+    """
+
+    def __init__(self, session_id, ttl=None, flush_every=None):
+        self.session_id = session_id
+        self.ttl = Config.CHECKPOINT_TTL if ttl is None else ttl
+        self.flush_every = flush_every or Config.CHECKPOINT_FLUSH_EVERY
+        self._loaded = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _key(self, playlist_id):
+        return f"checkpoint:{self.session_id}:{playlist_id}"
+
+    @property
+    def _destinations_key(self):
+        return f"checkpoint:{self.session_id}:destinations"
+
+    @property
+    def _index_key(self):
+        return f"checkpoint:{self.session_id}:keys"
+
+    def _load(self, playlist_id):
+        if playlist_id not in self._loaded:
+            raw = get_redis().hgetall(self._key(playlist_id))
+            self._loaded[playlist_id] = {
+                int(field): json.loads(value) for field, value in raw.items()
+            }
+        return self._loaded[playlist_id]
+
+    def get(self, playlist_id, position):
+        """Saved state for a track, loading the playlist's checkpoint on first use."""
+        return self._load(playlist_id).get(position)
+
+    def has_state(self, playlist_id):
+        """Whether an earlier run of this transfer already recorded tracks for the playlist."""
+        return bool(self._load(playlist_id))
+
+    def record_match(self, playlist_id, position, spotify_id, video_id):
+        self._record(playlist_id, position, {'s': spotify_id, 'v': video_id or "", 'w': 0})
+
+    def record_written(self, playlist_id, position, spotify_id, video_id):
+        self._record(playlist_id, position, {'s': spotify_id, 'v': video_id, 'w': 1})
+
+    def get_destination(self, name):
+        value = get_redis().hget(self._destinations_key, name)
+        return value.decode('utf-8') if value else None
+
+    def record_destination(self, name, youtube_playlist_id):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(self._destinations_key, name, youtube_playlist_id)
+        pipe.expire(self._destinations_key, self.ttl)
+        pipe.sadd(self._index_key, self._destinations_key)
+        pipe.expire(self._index_key, self.ttl)
+        pipe.execute()
+
+    def _record(self, playlist_id, position, state):
+        with self._lock:
+            self._pending.append((playlist_id, position, state))
+            should_flush = len(self._pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        pipe = get_redis().pipeline(transaction=False)
+        keys = set()
+        for playlist_id, position, state in pending:
+            key = self._key(playlist_id)
+            keys.add(key)
+            pipe.hset(key, position, json.dumps(state))
+        for key in keys:
+            pipe.expire(key, self.ttl)
+        pipe.sadd(self._index_key, *keys)
+        pipe.expire(self._index_key, self.ttl)
+        pipe.execute()
+
+    def clear(self, playlist_ids=None):
+        """Drop checkpoints once they are no longer needed.
+
+        With ``playlist_ids`` only those playlists are cleared (a finished
+        subtask); without, everything the session recorded goes.
+        """
+        with self._lock:
+            self._pending = []
+        r = get_redis()
+        if playlist_ids is not None:
+            keys = [self._key(playlist_id) for playlist_id in playlist_ids]
+            if keys:
+                pipe = r.pipeline(transaction=False)
+                pipe.delete(*keys)
+                pipe.srem(self._index_key, *keys)
+                pipe.execute()
+            for playlist_id in playlist_ids:
+                self._loaded.pop(playlist_id, None)
+            return
+        keys = [key.decode('utf-8') for key in r.smembers(self._index_key)]
+        r.delete(self._index_key, *keys)
+        self._loaded = {}
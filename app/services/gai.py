@@ -7,43 +7,67 @@ from langchain_groq import ChatGroq
 from typing_extensions import TypedDict
 from typing import Annotated
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import os
 import json
+import threading
+from config import Config
+from utils import normalize_string
+from .cache import TTLCache
 
 load_dotenv()
 
-def get_song(name, artist):
-  
+NO_RESULT = "No result found"
+
+# Headroom for the Tavily tool call on top of the LLM client's own timeouts.
+_TOOL_HEADROOM = 5
+
+
+class AITimeoutError(Exception):
+    """The lookup ran out of time; unlike NO_RESULT it says nothing about whether the song exists."""
+
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], add_messages]
+
+
+def pick_best_title(state: State):
+    last_message = state["messages"][-1]
+    try:
+        results = json.loads(last_message.content) if isinstance(last_message.content, str) else last_message.content
+    except Exception:
+        results = []
+
+    if isinstance(results, list) and len(results) > 0:
+        filtered = [
+            r for r in results
+            if "slowed" not in r.get("title", "").lower()
+            and "playlist" not in r.get("title", "").lower()
+            and "reverb" not in r.get("title", "").lower()
+            and "lyrics" not in r.get("title", "").lower()
+        ]
+        if filtered:
+            best = max(filtered, key=lambda r: r.get("score", 0))
+            return {"messages": [AIMessage(content=best["title"])]}
+
+    return {"messages": [AIMessage(content=NO_RESULT)]}
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_results = TTLCache(Config.AI_CACHE_SIZE, Config.AI_CACHE_TTL)
+_executor = ThreadPoolExecutor(max_workers=Config.AI_MAX_CONCURRENCY, thread_name_prefix="gai")
+
+
+def _build_graph():
     tavily_key = os.getenv("TAVILY_API_KEY")
-    groq_key = os.getenv("GROQ_API_KEY")
-
-    class State(TypedDict):
-        messages: Annotated[list[AnyMessage], add_messages]
-
-    def pick_best_title(state: State):
-        last_message = state["messages"][-1]
-        try:
-            results = json.loads(last_message.content) if isinstance(last_message.content, str) else last_message.content
-        except Exception:
-            results = []
-
-        if isinstance(results, list) and len(results) > 0:
-            filtered = [
-                r for r in results
-                if "slowed" not in r.get("title", "").lower()
-                and "playlist" not in r.get("title", "").lower()
-                and "reverb" not in r.get("title", "").lower()
-                and "lyrics" not in r.get("title", "").lower()
-            ]
-            if filtered:
-                best = max(filtered, key=lambda r: r.get("score", 0))
-                return {"messages": [AIMessage(content=best["title"])]}
-
-        return {"messages": [AIMessage(content="No result found")]}
-
-   
+
     tools = [TavilySearchResults(max_results=5, tavily_api_key=tavily_key)]
-    llm_with_tools = ChatGroq(model="gemma2-9b-it").bind_tools(tools)
+    llm_with_tools = ChatGroq(
+        model="gemma2-9b-it",
+        timeout=Config.AI_LLM_TIMEOUT,
+        max_retries=Config.AI_LLM_MAX_RETRIES
+    ).bind_tools(tools)
 
     def tool_calling_llm(state: State):
         return {"messages": [llm_with_tools.invoke(state["messages"])]}
@@ -56,9 +80,25 @@ def get_song(name, artist):
     builder.add_conditional_edges("tool_calling_llm", tools_condition)
     builder.add_edge("tools", "pick_best_title")
     builder.add_edge("pick_best_title", END)
-    graph = builder.compile()
+    return builder.compile()
 
-    test_messages = graph.invoke({
+
+def get_graph():
+    """The compiled graph holds no per-run state, so one instance serves every thread."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = _build_graph()
+    return _graph
+
+
+def _cache_key(name, artist):
+    return (normalize_string(name), normalize_string(artist))
+
+
+def _invoke(name, artist):
+    test_messages = get_graph().invoke({
         "messages": [
             HumanMessage(content=(
                 f'Given this Spotify track: "{artist} - {name}" '
@@ -69,5 +109,40 @@ def get_song(name, artist):
             ))
         ]
     })
-
     return test_messages["messages"][-1].content
+
+
+def _call_timeout():
+    client_worst_case = Config.AI_LLM_TIMEOUT * (Config.AI_LLM_MAX_RETRIES + 1) + _TOOL_HEADROOM
+    return max(Config.AI_TIMEOUT, client_worst_case)
+
+
+def get_song(name, artist, timeout=None):
+    """Best YouTube Music title for a track, or NO_RESULT; raises AITimeoutError when it runs out of time.
+
+    The timeout starts once the call holds one of the AI_MAX_CONCURRENCY
+    slots, so time spent queued behind other lookups doesn't count against it.
+    """
+    key = _cache_key(name, artist)
+    cached = _results.get(key)
+    if cached is not None:
+        return cached
+
+    started = threading.Event()
+
+    def run():
+        started.set()
+        return _invoke(name, artist)
+
+    future = _executor.submit(run)
+    started.wait()
+    try:
+        title = future.result(timeout=_call_timeout() if timeout is None else timeout)
+    except FutureTimeoutError:
+        # Not cached: a slow call says nothing about whether the song exists.
+        raise AITimeoutError(f"AI lookup for '{artist} - {name}' timed out")
+
+    if not isinstance(title, str) or not title.strip():
+        title = NO_RESULT
+    _results.set(key, title)
+    return title
@@ -0,0 +1,72 @@
+import gzip
+import json
+import threading
+from config import Config
+from redis_client import get_redis, get_async_redis
+
+
+def journal_key(session_id):
+    return f"journal:{session_id}"
+
+
+class TransferJournal:
+    """Append-only per-track record of a transfer, kept out of the Celery result backend.
+
+    Entries are buffered and pushed onto ``journal:{session_id}`` as
+    gzip-compressed NDJSON chunks of JOURNAL_CHUNK_SIZE lines. Gzip members
+    concatenate into a valid gzip stream, so the chunks can be served to
+    clients as-is.
+    """
+
+    def __init__(self, session_id, ttl=None, chunk_size=None):
+        self.session_id = session_id
+        self.key = journal_key(session_id)
+        self.ttl = Config.JOURNAL_TTL if ttl is None else ttl
+        self.chunk_size = chunk_size or Config.JOURNAL_CHUNK_SIZE
+        self.entries = 0
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self._pending.append(entry)
+            self.entries += 1
+            should_flush = len(self._pending) >= self.chunk_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        lines = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in pending)
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.rpush(self.key, gzip.compress(lines.encode('utf-8')))
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+            self.entries = 0
+        get_redis().delete(self.key)
+
+
+async def journal_chunk_count_async(session_id):
+    return await get_async_redis().llen(journal_key(session_id))
+
+
+async def iter_journal_chunks_async(session_id, start=0, stop=None, batch=20):
+    """Yield the raw gzip chunks in ``[start, stop)`` a few LRANGE calls at a time."""
+    redis = get_async_redis()
+    key = journal_key(session_id)
+    index = start
+    while stop is None or index < stop:
+        end = index + batch - 1 if stop is None else min(index + batch, stop) - 1
+        chunks = await redis.lrange(key, index, end)
+        if not chunks:
+            return
+        for chunk in chunks:
+            yield chunk
+        index += len(chunks)
@@ -0,0 +1,97 @@
+import json
+import time
+from config import Config
+from redis_client import get_redis
+from utils import log_message
+from .spotify_service import SpotifyClient
+
+
+def cache_key(session_id):
+    return f"playlists:{session_id}"
+
+
+def format_playlists(playlists):
+    formatted_playlists = []
+    for playlist in playlists:
+        formatted_playlists.append({
+            'id': playlist['id'],
+            'name': playlist['name'],
+            'description': playlist.get('description', ''),
+            'tracks_count': playlist['tracks']['total'],
+            'owner': playlist['owner']['display_name'],
+            'public': playlist.get('public', False),
+            'is_liked_songs': playlist['id'] == 'liked_songs'
+        })
+    return formatted_playlists
+
+
+def get_cached(session_id):
+    raw = get_redis().get(cache_key(session_id))
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def store(session_id, playlists):
+    entry = {
+        'playlists': format_playlists(playlists),
+        'snapshots': {p['id']: p.get('snapshot_id') or p['tracks']['total'] for p in playlists},
+        'fetched_at': time.time()
+    }
+    get_redis().set(cache_key(session_id), json.dumps(entry), ex=Config.PLAYLIST_CACHE_TTL)
+    return entry
+
+
+def invalidate(session_id):
+    get_redis().delete(cache_key(session_id))
+
+
+def refresh(session_id):
+    """Re-list the user's playlists and keep the cached entry if every snapshot_id still matches."""
+    r = get_redis()
+    lock_key = f"{cache_key(session_id)}:refreshing"
+    if not r.set(lock_key, 1, nx=True, ex=Config.PLAYLIST_CACHE_REFRESH_LOCK):
+        return get_cached(session_id)
+
+    try:
+        playlists = SpotifyClient(session_id).get_playlist()
+        cached = get_cached(session_id)
+        snapshots = {p['id']: p.get('snapshot_id') or p['tracks']['total'] for p in playlists}
+
+        if cached and cached.get('snapshots') == snapshots:
+            cached['fetched_at'] = time.time()
+            r.set(cache_key(session_id), json.dumps(cached), ex=Config.PLAYLIST_CACHE_TTL)
+            return cached
+
+        return store(session_id, playlists)
+    finally:
+        r.delete(lock_key)
+
+
+def get_playlists(session_id, background_tasks=None):
+    """Serve the formatted playlist list from cache, revalidating stale entries in the background."""
+    cached = get_cached(session_id)
+    if cached is None:
+        entry = refresh(session_id)
+        if entry is None:
+            # Another request is already filling the cache; fetch directly rather than wait.
+            entry = {'playlists': format_playlists(SpotifyClient(session_id).get_playlist())}
+        return entry['playlists']
+
+    age = time.time() - cached.get('fetched_at', 0)
+    if age > Config.PLAYLIST_CACHE_FRESH:
+        if background_tasks is None:
+            return (refresh(session_id) or cached)['playlists']
+        background_tasks.add_task(_refresh_quietly, session_id)
+
+    return cached['playlists']
+
+
+def _refresh_quietly(session_id):
+    try:
+        refresh(session_id)
+    except Exception as e:
+        log_message(f"Background playlist refresh failed for {session_id}: {e}", "WARNING", session_id=session_id)
@@ -0,0 +1,114 @@
+from config import Config
+from utils import log_message
+
+
+class PlaylistWriteBuffer:
+    """Collects matched videoIds per destination playlist and writes them in ordered chunks.
+
+    A playlist that doesn't exist yet is created together with its first chunk.
+    When a chunk is rejected it is retried one item at a time, so ``on_result``
+    is still called exactly once per item with the real outcome. Items are
+    opaque to the buffer and handed back to ``on_result`` unchanged;
+    ``on_chunk`` runs after every chunk once all its results are reported.
+    """
+
+    def __init__(self, youtube_client, session_id, on_result, chunk_size=None, on_create=None, on_chunk=None):
+        self.youtube_client = youtube_client
+        self.session_id = session_id
+        self.on_result = on_result
+        self.on_create = on_create
+        self.on_chunk = on_chunk
+        self.chunk_size = chunk_size or Config.PLAYLIST_WRITE_CHUNK_SIZE
+        self.targets = {}
+
+    def open(self, key, name, youtube_playlist_id=None, description="", privacy_status="PRIVATE"):
+        """Register a destination; without a youtube_playlist_id it is created on first flush."""
+        if key not in self.targets:
+            self.targets[key] = {
+                'name': name,
+                'youtube_playlist_id': youtube_playlist_id,
+                'description': description,
+                'privacy_status': privacy_status,
+                'failed': False,
+                'pending': []
+            }
+        return self.targets[key]
+
+    def youtube_playlist_id(self, key):
+        target = self.targets.get(key)
+        return target['youtube_playlist_id'] if target else None
+
+    def add(self, key, item, video_id):
+        target = self.targets[key]
+        target['pending'].append((item, video_id))
+        if len(target['pending']) >= self.chunk_size:
+            self._flush_target(target)
+
+    def flush(self, key=None):
+        keys = [key] if key is not None else list(self.targets)
+        for k in keys:
+            target = self.targets.get(k)
+            if target is None:
+                continue
+            while target['pending']:
+                self._flush_target(target)
+            if target['youtube_playlist_id'] is None and not target['failed']:
+                # Keep the old behaviour of creating the playlist even if nothing matched.
+                self._create(target, [])
+
+    def _flush_target(self, target):
+        chunk = target['pending'][:self.chunk_size]
+        target['pending'] = target['pending'][self.chunk_size:]
+        if not chunk:
+            return
+        self._write_chunk(target, chunk)
+        if self.on_chunk:
+            self.on_chunk()
+
+    def _write_chunk(self, target, chunk):
+        if target['failed']:
+            self._report(chunk, False)
+            return
+
+        video_ids = [video_id for _, video_id in chunk]
+
+        if target['youtube_playlist_id'] is None:
+            if self._create(target, video_ids):
+                self._report(chunk, True)
+                return
+            if not self._create(target, []):
+                self._report(chunk, False)
+                return
+        elif self.youtube_client.add_songs_to_playlist(self.session_id, target['youtube_playlist_id'], video_ids):
+            self._report(chunk, True)
+            return
+
+        if len(chunk) > 1:
+            log_message(f"Batch write to '{target['name']}' failed, retrying {len(chunk)} tracks individually", "WARNING", session_id=self.session_id, playlist=target['name'])
+        for item in chunk:
+            success = self.youtube_client.add_songs_to_playlist(
+                self.session_id, target['youtube_playlist_id'], [item[1]]
+            )
+            self._report([item], success)
+
+    def _create(self, target, video_ids):
+        try:
+            target['youtube_playlist_id'] = self.youtube_client.create_playlist(
+                session_id=self.session_id,
+                name=target['name'],
+                description=target['description'],
+                privacy_status=target['privacy_status'],
+                video_ids=video_ids or None
+            )
+            if self.on_create:
+                self.on_create(target['name'], target['youtube_playlist_id'])
+            return True
+        except Exception as e:
+            log_message(f"Failed to create playlist '{target['name']}': {str(e)}", "ERROR", session_id=self.session_id, playlist=target['name'])
+            if not video_ids:
+                target['failed'] = True
+            return False
+
+    def _report(self, chunk, success):
+        for item, video_id in chunk:
+            self.on_result(item, video_id, success)
@@ -0,0 +1,315 @@
+import re
+import json
+import time
+import asyncio
+import threading
+from config import Config
+from redis_client import get_redis, get_async_redis, get_async_stream_redis
+from utils import log_message
+
+TERMINAL_STATUSES = ('completed', 'cancelled', 'failed')
+COUNTERS = ('processed', 'total', 'successful', 'failed')
+STREAM_ID = re.compile(r"^\d+(-\d+)?$")
+
+
+def progress_key(session_id):
+    return f"progress:{session_id}"
+
+
+def events_key(session_id):
+    return f"progress_events:{session_id}"
+
+
+def read_progress(session_id):
+    """Return the decoded progress hash for a session (empty dict if none) in one round-trip."""
+    return _decode_progress(get_redis().hgetall(progress_key(session_id)))
+
+
+async def read_progress_async(session_id):
+    """``read_progress`` for the API's event loop."""
+    return _decode_progress(await get_async_redis().hgetall(progress_key(session_id)))
+
+
+def _fold_parts(state):
+    """Add the per-subtask ``{counter}:{part}`` fields into the session-wide counters."""
+    totals = {name: int(state.get(name) or 0) for name in COUNTERS}
+    for field in list(state):
+        name, sep, _ = field.partition(':')
+        if sep and name in totals:
+            totals[name] += int(state.pop(field) or 0)
+    state.update({name: str(value) for name, value in totals.items()})
+    return totals
+
+
+def _decode_progress(raw):
+    """Transfers fanned out over several subtasks only report per-subtask counters, so
+    those are summed and progress and ETA are derived here from processed/total.
+    """
+    state = {k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()}
+    if not state:
+        return state
+
+    try:
+        totals = _fold_parts(state)
+    except ValueError:
+        return state
+    processed, total = totals['processed'], totals['total']
+
+    if total > 0 and state.get('status') == 'running':
+        state['progress'] = str(round(min((processed / total) * 100, 100), 2))
+        started_at = float(state.get('started_at') or 0)
+        if not state.get('eta_seconds') and started_at and processed and total > processed:
+            rate = processed / max(time.time() - started_at, 1e-6)
+            state['eta_seconds'] = str(int((total - processed) / rate))
+    return state
+
+
+async def latest_event_id_async(session_id):
+    """ID of the newest retained progress event, or "0-0" when there is none."""
+    entries = await get_async_redis().xrevrange(events_key(session_id), count=1)
+    return entries[0][0].decode('utf-8') if entries else "0-0"
+
+
+def stream_id(entry_id):
+    """Sortable form of a Redis stream ID ("1700000000000-3" -> (1700000000000, 3))."""
+    ms, _, seq = entry_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+def _decode_entries(entries):
+    return [(entry_id.decode('utf-8'), json.loads(fields[b'data'])) for entry_id, fields in entries]
+
+
+async def read_events_after_async(session_id, last_id, count=500):
+    """Retained progress events after ``last_id`` as (id, event) pairs, without blocking."""
+    entries = await get_async_redis().xrange(events_key(session_id), min=f"({last_id}", max="+", count=count)
+    return _decode_entries(entries)
+
+
+class ProgressStreamHub:
+    """One blocking XREAD per API process, fanned out to every streaming client.
+
+    Each subscribed session has a cursor; a single reader task blocks on all
+    of their streams at once on its own connection and pushes new events
+    onto each subscriber's queue, so open streams don't hold request-pool
+    connections. A subscriber that falls behind gets ``None`` instead of
+    the events it missed and catches up from Redis itself. Sessions added
+    while the reader is blocked are picked up on its next read; their
+    cursor starts at the newest event, so nothing is skipped.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._cursors = {}
+        self._task = None
+        self._wake = None
+
+    async def subscribe(self, session_id):
+        queue = asyncio.Queue(maxsize=Config.PROGRESS_STREAM_QUEUE_SIZE)
+        if session_id not in self._cursors:
+            latest = await latest_event_id_async(session_id)
+            self._cursors.setdefault(session_id, latest)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        self._ensure_running()
+        return queue
+
+    def unsubscribe(self, session_id, queue):
+        queues = self._subscribers.get(session_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[session_id]
+            self._cursors.pop(session_id, None)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._wake.set()
+
+    async def _run(self):
+        redis = get_async_stream_redis()
+        while True:
+            if not self._cursors:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            streams = {events_key(session_id): cursor for session_id, cursor in self._cursors.items()}
+            try:
+                response = await redis.xread(streams, block=Config.PROGRESS_STREAM_BLOCK_MS, count=100)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_message(f"Progress stream read failed: {e}", "WARNING")
+                await asyncio.sleep(1)
+                continue
+            for key, entries in response or []:
+                session_id = key.decode('utf-8').split(':', 1)[1]
+                if session_id not in self._cursors:
+                    continue
+                events = _decode_entries(entries)
+                self._cursors[session_id] = events[-1][0]
+                for queue in list(self._subscribers.get(session_id, ())):
+                    self._deliver(queue, events)
+
+    @staticmethod
+    def _deliver(queue, events):
+        for event in events:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                return
+
+
+progress_hub = ProgressStreamHub()
+
+
+class ProgressPublisher:
+    """Coalesces per-track progress into one Redis hash per session.
+
+    Writes happen at most every PROGRESS_MIN_INTERVAL_MS, or sooner when the
+    whole-percent value changes or the caller forces it (stage changes, final
+    states). Every write refreshes the key's TTL.
+
+    With ``shared=True`` several publishers (one per subtask) feed the same
+    hash: each keeps its absolute counters in ``{counter}:{part}`` fields,
+    so a retried subtask overwrites its earlier run instead of counting it
+    twice, and summing them and deriving progress/ETA is left to
+    ``read_progress``.
+
+    Every write also appends a snapshot event to the capped
+    ``progress_events:{session_id}`` stream, together with any per-track
+    outcomes recorded since the last write, so streaming clients can follow
+    (and resume) a transfer without polling.
+    """
+
+    COUNTERS = COUNTERS
+
+    def __init__(self, session_id, min_interval_ms=None, ttl=None, shared=False, part=None):
+        self.session_id = session_id
+        self.shared = shared
+        self.part = part or "0"
+        self._base_total = None
+        self.key = progress_key(session_id)
+        self.events_key = events_key(session_id)
+        self._events = []
+        self._events_lock = threading.Lock()
+        self.min_interval = (Config.PROGRESS_MIN_INTERVAL_MS if min_interval_ms is None else min_interval_ms) / 1000.0
+        self.ttl = Config.PROGRESS_TTL if ttl is None else ttl
+        self.started_at = None
+        self._last_write = 0.0
+        self._last_percent = None
+
+    def update(self, stage, processed=0, total=0, successful=0, failed=0, current_track="", estimated=False, force=False):
+        now = time.monotonic()
+        if self.started_at is None and processed:
+            self.started_at = now
+
+        progress = round(min((processed / total) * 100, 100), 2) if total > 0 else 0.0
+        percent = int(progress)
+
+        if not force and percent == self._last_percent and now - self._last_write < self.min_interval:
+            return progress
+
+        if self.shared:
+            self._write_part(stage, current_track, {
+                'processed': processed, 'total': total, 'successful': successful, 'failed': failed
+            })
+            self._last_write = now
+            self._last_percent = percent
+            return progress
+
+        eta = ""
+        if self.started_at is not None and processed and total > processed:
+            rate = processed / max(now - self.started_at, 1e-6)
+            eta = int((total - processed) / rate)
+
+        self._write({
+            'type': 'progress',
+            'progress': progress,
+            'processed': processed,
+            'total': total,
+            'total_estimated': int(bool(estimated)),
+            'successful': successful,
+            'failed': failed,
+            'current_track': current_track or "",
+            'stage': stage,
+            'eta_seconds': eta,
+            'updated_at': time.time()
+        }, event=True)
+        self._last_write = now
+        self._last_percent = percent
+        return progress
+
+    def _write_part(self, stage, current_track, counters):
+        # The orchestrator already seeded the declared total, which is what a subtask's
+        # first update starts from; only how far its estimate moves from there is added.
+        if self._base_total is None:
+            self._base_total = counters['total']
+        values = dict(counters, total=counters['total'] - self._base_total)
+        fields = {f"{name}:{self.part}": values[name] for name in self.COUNTERS}
+        fields.update(stage=stage, current_track=current_track or "", updated_at=time.time())
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(self.key, mapping=fields)
+        pipe.expire(self.key, self.ttl)
+        pipe.hgetall(self.key)
+        raw = pipe.execute()[-1]
+
+        # The stream carries session-wide totals, not this subtask's counters.
+        event = _fold_parts({k.decode('utf-8'): v.decode('utf-8') for k, v in raw.items()})
+        if event['total'] > 0:
+            event['progress'] = round(min((event['processed'] / event['total']) * 100, 100), 2)
+        event.update(type='progress', stage=stage, current_track=current_track or "")
+        pipe = get_redis().pipeline(transaction=False)
+        self._queue_events(pipe, event)
+        pipe.execute()
+
+    def record_track(self, playlist, track, outcome, video_id=None):
+        """Queue a per-track outcome (added/skipped/not_found/failed); sent with the next write."""
+        with self._events_lock:
+            self._events.append({
+                'type': 'track', 'playlist': playlist, 'track': track,
+                'outcome': outcome, 'videoId': video_id or ""
+            })
+
+    def _queue_events(self, pipe, event=None):
+        with self._events_lock:
+            events, self._events = self._events, []
+        if event is not None:
+            events.append(event)
+        for event in events:
+            pipe.xadd(self.events_key, {'data': json.dumps(event)}, maxlen=Config.PROGRESS_STREAM_MAXLEN, approximate=True)
+        if events:
+            pipe.expire(self.events_key, self.ttl)
+
+    def start(self, total=0):
+        """Clear whatever a previous transfer left behind and mark the session as running."""
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.delete(self.key, self.events_key)
+        pipe.delete(f"cancel_{self.session_id}")
+        fields = {
+            'status': 'running', 'progress': 0, 'stage': 'starting',
+            'processed': 0, 'total': total, 'successful': 0, 'failed': 0,
+            'started_at': time.time(), 'updated_at': time.time()
+        }
+        pipe.hset(self.key, mapping=fields)
+        pipe.expire(self.key, self.ttl)
+        self._queue_events(pipe, dict(fields, type='status'))
+        pipe.execute()
+
+    def set_status(self, status, **fields):
+        """Record a task status (running/completed/failed/cancelled); always written immediately."""
+        fields['status'] = status
+        fields['updated_at'] = time.time()
+        self._write(fields, event=dict(fields, type='status'))
+
+    def _write(self, fields, event=None):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(self.key, mapping={k: v for k, v in fields.items() if k != 'type'})
+        pipe.expire(self.key, self.ttl)
+        self._queue_events(pipe, dict(fields) if event is True else event)
+        pipe.execute()
@@ -0,0 +1,174 @@
+import re
+import time
+from functools import wraps
+from config import Config
+from redis_client import get_redis
+from utils import log_message
+
+# Takes one token from both the upstream-wide and the per-session bucket, or
+# neither; returns how many ms to wait before trying again. An active backoff
+# key (set after a 429/5xx) blocks every caller until it expires.
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local backoff = redis.call('PTTL', KEYS[3])
+if backoff > 0 then
+    return backoff
+end
+
+local waits = {}
+local states = {}
+for i = 1, 2 do
+    local rate = tonumber(ARGV[2 * i])
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) / 1000 * rate)
+    states[i] = tokens
+    if tokens >= 1 then
+        waits[i] = 0
+    else
+        waits[i] = math.ceil((1 - tokens) / rate * 1000)
+    end
+end
+
+local wait = math.max(waits[1], waits[2])
+for i = 1, 2 do
+    local tokens = states[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], 60000)
+end
+return wait
+"""
+
+_HTTP_STATUS = re.compile(r"HTTP (\d{3})")
+
+
+def throttle_status(error):
+    """Return (status, retry_after_seconds) for a 429/5xx upstream error, else (None, None)."""
+    status = getattr(error, 'http_status', None)
+    headers = getattr(error, 'headers', None) or {}
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+        headers = getattr(response, 'headers', None) or headers
+    if status is None:
+        found = _HTTP_STATUS.search(str(error))
+        status = int(found.group(1)) if found else None
+
+    if status == 429 or (status is not None and status >= 500):
+        retry_after = headers.get('Retry-After') if hasattr(headers, 'get') else None
+        try:
+            return status, float(retry_after) if retry_after else None
+        except ValueError:
+            return status, None
+    return None, None
+
+
+class RateLimiter:
+    """Cluster-wide token buckets in Redis, one per upstream and one per upstream/session."""
+
+    def __init__(self):
+        self._script = None
+
+    def _acquire_script(self):
+        if self._script is None:
+            self._script = get_redis().register_script(_ACQUIRE_SCRIPT)
+        return self._script
+
+    def acquire(self, upstream, session_id):
+        limits = Config.RATE_LIMITS[upstream]
+        keys = [
+            f"ratelimit:{upstream}",
+            f"ratelimit:{upstream}:{session_id}",
+            f"ratelimit:{upstream}:backoff"
+        ]
+        args = [limits['rate'], limits['burst'], limits['session_rate'], limits['session_burst']]
+        while True:
+            try:
+                wait_ms = self._acquire_script()(keys=keys, args=[int(time.time() * 1000)] + args)
+            except Exception as e:
+                # Never let the limiter take transfers down with it.
+                log_message(f"Rate limiter unavailable, continuing unthrottled: {e}", "WARNING")
+                return
+            if not wait_ms:
+                return
+            time.sleep(min(int(wait_ms), Config.RATE_LIMIT_MAX_WAIT_MS) / 1000.0)
+
+    def report_throttled(self, upstream, retry_after=None):
+        """Back every worker off from an upstream; repeated throttling doubles the delay."""
+        try:
+            r = get_redis()
+            level_key = f"ratelimit:{upstream}:backoff_level"
+            pipe = r.pipeline(transaction=False)
+            pipe.incr(level_key)
+            pipe.expire(level_key, Config.RATE_LIMIT_BACKOFF_DECAY)
+            level = pipe.execute()[0]
+            if retry_after:
+                delay_ms = int(retry_after * 1000)
+            else:
+                delay_ms = min(Config.RATE_LIMIT_BACKOFF_BASE_MS * 2 ** (level - 1), Config.RATE_LIMIT_BACKOFF_MAX_MS)
+            r.set(f"ratelimit:{upstream}:backoff", 1, px=max(delay_ms, 1))
+        except Exception as e:
+            log_message(f"Failed to record {upstream} backoff: {e}", "WARNING")
+
+
+rate_limiter = RateLimiter()
+
+
+# Upstream methods that change state. A 5xx on one of these may have been
+# applied anyway, so they are only retried on 429 (rejected before running).
+WRITE_METHODS = frozenset({
+    'create_playlist', 'edit_playlist', 'delete_playlist',
+    'add_playlist_items', 'remove_playlist_items', 'rate_song',
+    'playlist_add_items', 'playlist_remove_all_occurrences_of_items',
+    'user_playlist_create', 'current_user_saved_tracks_add'
+})
+
+
+class RateLimitedClient:
+    """Wraps an upstream client so every public method call goes through the rate limiter.
+
+    429/5xx responses set a shared backoff and are retried up to
+    UPSTREAM_MAX_RETRIES times, except that WRITE_METHODS are retried on
+    429 only and a 5xx is raised for the caller's own fallback to handle.
+    Anything else is raised unchanged.
+    """
+
+    def __init__(self, client, upstream, session_id, limiter=None):
+        self._client = client
+        self._upstream = upstream
+        self._session_id = session_id
+        self._limiter = limiter or rate_limiter
+
+    @property
+    def wrapped(self):
+        return self._client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        is_write = name in WRITE_METHODS
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            attempt = 0
+            while True:
+                self._limiter.acquire(self._upstream, self._session_id)
+                try:
+                    return attr(*args, **kwargs)
+                except Exception as e:
+                    status, retry_after = throttle_status(e)
+                    attempt += 1
+                    if status is None:
+                        raise
+                    self._limiter.report_throttled(self._upstream, retry_after)
+                    if (is_write and status != 429) or attempt > Config.UPSTREAM_MAX_RETRIES:
+                        raise
+
+        return call
@@ -0,0 +1,90 @@
+from rapidfuzz import fuzz, process
+from config import Config
+from utils import normalize_string, parse_duration
+
+
+class TrackScorer:
+    """Weighted title/artist similarity computed with rapidfuzz's batched C scorers.
+
+    Strings are normalized once per track/candidate and whole candidate lists
+    (or aligned batches of pairs) are scored in a single cdist/cpdist call
+    instead of two ``fuzz.ratio`` calls per candidate.
+    """
+
+    def __init__(self, title_weight=None, artist_weight=None):
+        self.title_weight = Config.SIMILARITY_TITLE_WEIGHT if title_weight is None else title_weight
+        self.artist_weight = Config.SIMILARITY_ARTIST_WEIGHT if artist_weight is None else artist_weight
+
+    @staticmethod
+    def normalize(title, artist):
+        return normalize_string(title), normalize_string(artist)
+
+    @staticmethod
+    def candidate_artist(result):
+        artists = result.get('artists') or [{}]
+        return artists[0].get('name', '') or ''
+
+    @staticmethod
+    def candidate_duration(result):
+        if result.get('duration_seconds') is not None:
+            return parse_duration(result['duration_seconds'])
+        return parse_duration(result.get('duration'))
+
+    @staticmethod
+    def duration_tolerance(target_seconds):
+        return max(Config.DURATION_TOLERANCE_SECONDS, target_seconds * Config.DURATION_TOLERANCE_RATIO)
+
+    def duration_fit(self, target_seconds, candidate_seconds):
+        """Return (delta_seconds, closeness in [0, 1]); closeness is None when either side is unknown."""
+        if not target_seconds or candidate_seconds is None:
+            return None, None
+        delta = candidate_seconds - target_seconds
+        tolerance = self.duration_tolerance(target_seconds)
+        return delta, max(0.0, 1.0 - abs(delta) / tolerance)
+
+    def rank(self, similarity, closeness):
+        """Ranking score: similarity blended with duration closeness when it is known."""
+        if closeness is None:
+            return similarity
+        return (1 - Config.DURATION_WEIGHT) * similarity + Config.DURATION_WEIGHT * closeness
+
+    def score_candidates(self, title, artist, candidates):
+        """Score one Spotify track against a list of (title, artist) candidates; returns floats in [0, 1]."""
+        if not candidates:
+            return []
+        return self.score_normalized(*self.normalize(title, artist), candidates)
+
+    def score_normalized(self, norm_title, norm_artist, candidates):
+        """``score_candidates`` for a track already passed through ``normalize``."""
+        if not candidates:
+            return []
+        titles = [normalize_string(t) for t, _ in candidates]
+        artists = [normalize_string(a) for _, a in candidates]
+
+        title_scores = process.cdist([norm_title], titles, scorer=fuzz.ratio)[0]
+        artist_scores = process.cdist([norm_artist], artists, scorer=fuzz.ratio)[0]
+        return [
+            (self.title_weight * t + self.artist_weight * a) / 100.0
+            for t, a in zip(title_scores.tolist(), artist_scores.tolist())
+        ]
+
+    def score_pairs(self, pairs):
+        """Score aligned ((title, artist), (cand_title, cand_artist)) pairs from many tracks in one call."""
+        if not pairs:
+            return []
+        left_titles, left_artists, right_titles, right_artists = [], [], [], []
+        for (title, artist), (cand_title, cand_artist) in pairs:
+            left_titles.append(normalize_string(title))
+            left_artists.append(normalize_string(artist))
+            right_titles.append(normalize_string(cand_title))
+            right_artists.append(normalize_string(cand_artist))
+
+        title_scores = process.cpdist(left_titles, right_titles, scorer=fuzz.ratio, workers=-1)
+        artist_scores = process.cpdist(left_artists, right_artists, scorer=fuzz.ratio, workers=-1)
+        return [
+            (self.title_weight * t + self.artist_weight * a) / 100.0
+            for t, a in zip(title_scores.tolist(), artist_scores.tolist())
+        ]
+
+
+scorer = TrackScorer()
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from cryptography.fernet import Fernet, InvalidToken
+from spotipy.cache_handler import CacheHandler
+from config import Config
+from redis_client import get_redis
+from .cache import TTLCache
+
+
+class RedisCredentialBackend:
+    """Credentials as ``session:{session_id}:{kind}`` keys, expiring with Redis TTLs."""
+
+    @staticmethod
+    def _key(session_id, kind):
+        return f"session:{session_id}:{kind}"
+
+    def get(self, session_id, kind):
+        return get_redis().get(self._key(session_id, kind))
+
+    def set(self, session_id, kind, value, ttl):
+        get_redis().set(self._key(session_id, kind), value, ex=ttl)
+
+    def delete(self, session_id, kind):
+        get_redis().delete(self._key(session_id, kind))
+
+
+class FileCredentialBackend:
+    """One file per credential under SESSION_STORE_DIR; for single-machine development only."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, session_id, kind):
+        return os.path.join(self.directory, f"{kind}_{session_id}.json")
+
+    def get(self, session_id, kind):
+        try:
+            with open(self._path(session_id, kind), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('expires_at', 0) <= time.time():
+            self.delete(session_id, kind)
+            return None
+        return record['value'].encode('utf-8')
+
+    def set(self, session_id, kind, value, ttl):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id, kind)
+        with self._lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': time.time() + ttl, 'value': value.decode('utf-8')}, f)
+            os.replace(tmp_path, path)
+
+    def delete(self, session_id, kind):
+        try:
+            os.remove(self._path(session_id, kind))
+        except OSError:
+            pass
+
+
+class SessionStore:
+    """Per-session credentials (Spotify tokens, YouTube Music headers), encrypted at rest.
+
+    Values are JSON documents sealed with Fernet before they reach the
+    backend. Reads go through a short-lived in-process cache so the hot
+    paths (``authenticate`` on every task) rarely touch the backend; misses
+    are not cached, so a login on another node shows up immediately.
+    """
+
+    def __init__(self, backend, key, ttl=None, cache_size=None, cache_ttl=None):
+        self.backend = backend
+        self.ttl = Config.SESSION_TTL if ttl is None else ttl
+        self._fernet = Fernet(key)
+        self._cache = TTLCache(
+            Config.SESSION_CACHE_SIZE if cache_size is None else cache_size,
+            Config.SESSION_CACHE_TTL if cache_ttl is None else cache_ttl
+        )
+
+    def get(self, session_id, kind):
+        cached = self._cache.get((session_id, kind))
+        if cached is not None:
+            return cached
+        sealed = self.backend.get(session_id, kind)
+        if sealed is None:
+            return None
+        try:
+            value = json.loads(self._fernet.decrypt(sealed))
+        except (InvalidToken, ValueError):
+            return None
+        self._cache.set((session_id, kind), value)
+        return value
+
+    def set(self, session_id, kind, value, ttl=None):
+        sealed = self._fernet.encrypt(json.dumps(value).encode('utf-8'))
+        self.backend.set(session_id, kind, sealed, self.ttl if ttl is None else ttl)
+        self._cache.set((session_id, kind), value)
+
+    def delete(self, session_id, kind):
+        self._cache.delete((session_id, kind))
+        self.backend.delete(session_id, kind)
+
+
+def _encryption_key():
+    if Config.SESSION_STORE_KEY:
+        return Config.SESSION_STORE_KEY
+    if not Config.SECRET:
+        raise ValueError("SESSION_STORE_KEY or secret must be set to encrypt session credentials")
+    return base64.urlsafe_b64encode(hashlib.sha256(Config.SECRET.encode('utf-8')).digest())
+
+
+def _build_store():
+    if Config.SESSION_STORE_BACKEND == 'file':
+        backend = FileCredentialBackend(Config.SESSION_STORE_DIR)
+    else:
+        backend = RedisCredentialBackend()
+    return SessionStore(backend, _encryption_key())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Process-wide store, built on first use from SESSION_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _build_store()
+    return _store
+
+
+class SessionCacheHandler(CacheHandler):
+    """spotipy cache handler that keeps a session's token info in the session store."""
+
+    KIND = 'spotify'
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+    def get_cached_token(self):
+        return get_session_store().get(self.session_id, self.KIND)
+
+    def save_token_to_cache(self, token_info):
+        get_session_store().set(self.session_id, self.KIND, token_info)
@@ -1,9 +1,8 @@
 from ytmusicapi import YTMusic
-import os
-
-import json
-import os
+import time
 import re
+from utils import log_message
+from .session_store import get_session_store
 
 def setup(session_id: str, header_raw):
     try:
@@ -34,41 +33,28 @@ def setup(session_id: str, header_raw):
         }
         
        
-        print("Created header structure:")
-        print(json.dumps(yt_headers, indent=2))
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        filepath = os.path.join(base_dir, f"header{session_id}.json")
-        with open(filepath, 'w') as f:
-            json.dump(yt_headers, f, indent=2)
+        get_session_store().set(session_id, 'ytmusic', {'headers': yt_headers, 'updated_at': time.time()})
+        log_message("Stored YouTube Music headers, testing authentication", session_id=session_id)
         
-        if os.path.exists(filepath):
-            print(f"{filepath} created successfully!")
+        try:
             
-            print("Testing authentication")
-            try:
-                
-                ytmusic = YTMusic(filepath)
-                
-                playlists = ytmusic.get_library_playlists(limit=1)
+            ytmusic = YTMusic(auth=yt_headers)
+            
+            playlists = ytmusic.get_library_playlists(limit=1)
+            
+            if playlists is not None:
+                log_message(f"Authentication test successful (playlists: {len(playlists)})", session_id=session_id)
+                return {"success": True, "message": "Authentication successful and headers saved."}
+            else:
+                log_message("Authentication works but no playlists found", session_id=session_id)
+                return {"success": True, "message": "Authentication successful, but no playlists found."}
                 
-                if playlists is not None:
-                    print(f"Authentication test successful!")
-                    print(f"Found library access (playlists: {len(playlists)})")
-                    return {"success": True, "message": "Authentication successful and file created."}
-                else:
-                    print("Authentication works but no playlists found")
-                    print("This is normal if you don't have any playlists")
-                    return {"success": True, "message": "Authentication successful, but no playlists found."}
-                    
-            except Exception as test_error:
-                print(f"File created but test failed: {test_error}")
-                print("The file might still work for transfers")
-                return {"success": True, "message": f"File created but authentication test failed: {test_error}"}
-        else:
-            return {"success": False, "message": "Header file was not created."}
+        except Exception as test_error:
+            log_message(f"Headers saved but test failed: {test_error}", "WARNING", session_id=session_id)
+            return {"success": True, "message": f"Headers saved but authentication test failed: {test_error}"}
             
     except Exception as e:
-        print(f"Setup failed: {e}")
+        log_message(f"Setup failed: {e}", "ERROR", session_id=session_id)
         return {"success": False, "message": f"Setup failed: {e}"}
 
 
@@ -1,13 +1,96 @@
+import time
+import threading
+import requests
 import spotipy
+from requests.adapters import HTTPAdapter
 from spotipy.oauth2 import SpotifyOAuth
 from config import Config
-import os
+from utils import log_message
+from .cache import TTLCache
+from .rate_limit import RateLimitedClient
+from .session_store import SessionCacheHandler
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class SpotifyClientRegistry:
+    """Per-process authenticated spotipy clients keyed by session, with the profile cached.
+
+    Clients share one pooled ``requests.Session`` and read their token
+    through the session store on each request, so an entry stays usable
+    across refreshes. Tokens close to expiry are refreshed in the background
+    instead of inline on the next call. An entry is dropped when the
+    session's refresh token changes (a new login) or after an auth error.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._cache = TTLCache(
+            Config.SPOTIFY_REGISTRY_SIZE if maxsize is None else maxsize,
+            Config.SPOTIFY_REGISTRY_TTL if ttl is None else ttl
+        )
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=Config.SPOTIFY_HTTP_POOL_SIZE, pool_maxsize=Config.SPOTIFY_HTTP_POOL_SIZE)
+        self.http.mount('https://', adapter)
+        self._refresher = ThreadPoolExecutor(max_workers=Config.SPOTIFY_REFRESH_WORKERS, thread_name_prefix="spotify-refresh")
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, token_info):
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+        if entry['refresh_token'] != token_info.get('refresh_token'):
+            self._cache.delete(session_id)
+            return None
+        return entry
+
+    def put(self, session_id, spotify, auth_manager, user_info, token_info):
+        entry = {
+            'spotify': spotify,
+            'auth_manager': auth_manager,
+            'user_id': user_info['id'],
+            'display_name': user_info.get('display_name'),
+            'refresh_token': token_info.get('refresh_token')
+        }
+        self._cache.set(session_id, entry)
+        return entry
+
+    def invalidate(self, session_id):
+        self._cache.delete(session_id)
+
+    def refresh_ahead(self, session_id, entry, token_info):
+        """Schedule a background refresh when the token expires within SPOTIFY_REFRESH_AHEAD."""
+        if not token_info.get('refresh_token'):
+            return
+        if token_info.get('expires_at', 0) - time.time() > Config.SPOTIFY_REFRESH_AHEAD:
+            return
+        with self._lock:
+            if session_id in self._refreshing:
+                return
+            self._refreshing.add(session_id)
+        self._refresher.submit(self._refresh, session_id, entry['auth_manager'], token_info['refresh_token'])
+
+    def _refresh(self, session_id, auth_manager, refresh_token):
+        try:
+            # Saves the new token through the session store's cache handler.
+            auth_manager.refresh_access_token(refresh_token)
+        except Exception as e:
+            log_message(f"Background Spotify token refresh failed: {e}", "WARNING", session_id=session_id)
+        finally:
+            with self._lock:
+                self._refreshing.discard(session_id)
+
+
+spotify_registry = SpotifyClientRegistry()
+
 
 class SpotifyClient:
     def __init__(self, session_id=None):
         self.scope = "user-library-read playlist-read-private playlist-read-collaborative"
         self.sp = None
         self.user_id = None
+        self.display_name = None
         self.session_id = session_id
         self.authenticated = False
         self.auth_error = None
@@ -17,40 +100,51 @@ class SpotifyClient:
             if not self.session_id:
                 return False, "No session_id provided for Spotify authentication."
 
-            cache_path = os.path.join(Config.SPOTIFY_CACHE_DIR, f"spotify_cache_{self.session_id}.json")
-
-            if not os.path.exists(cache_path):
+            cache_handler = SessionCacheHandler(self.session_id)
+            token_info = cache_handler.get_cached_token()
+            if token_info is None:
                 return False, "Spotify not authenticated yet. Please login first."
 
-            auth_manager = SpotifyOAuth(
-                client_id=Config.SPOTIFY_CLIENT_ID,
-                client_secret=Config.SPOTIFY_CLIENT_SECRET,
-                redirect_uri=Config.SPOTIFY_REDIRECT_URI,
-                scope=self.scope,
-                cache_path=cache_path
-            )
+            entry = spotify_registry.get(self.session_id, token_info)
+            if entry is None:
+                auth_manager = SpotifyOAuth(
+                    client_id=Config.SPOTIFY_CLIENT_ID,
+                    client_secret=Config.SPOTIFY_CLIENT_SECRET,
+                    redirect_uri=Config.SPOTIFY_REDIRECT_URI,
+                    scope=self.scope,
+                    cache_handler=cache_handler,
+                    requests_session=spotify_registry.http
+                )
 
-            token_info = auth_manager.get_cached_token()
-            if not token_info:
-                return False, "Spotify token missing or expired. Please login again."
+                token_info = auth_manager.get_cached_token()
+                if not token_info:
+                    return False, "Spotify token missing or expired. Please login again."
 
-            self.sp = spotipy.Spotify(auth=token_info["access_token"])
-            user_info = self.sp.current_user()
-            self.user_id = user_info["id"]
+                spotify = spotipy.Spotify(auth_manager=auth_manager, requests_session=spotify_registry.http)
+                user_info = RateLimitedClient(spotify, 'spotify', self.session_id).current_user()
+                entry = spotify_registry.put(self.session_id, spotify, auth_manager, user_info, token_info)
+            else:
+                spotify_registry.refresh_ahead(self.session_id, entry, token_info)
+
+            self.sp = RateLimitedClient(entry['spotify'], 'spotify', self.session_id)
+            self.user_id = entry['user_id']
+            self.display_name = entry['display_name']
 
             self.authenticated = True
-            return True, f"Successfully authenticated as {user_info['display_name']}"
+            return True, f"Successfully authenticated as {self.display_name}"
 
         except Exception as e:
+            spotify_registry.invalidate(self.session_id)
             self.authenticated = False
             self.auth_error = str(e)
             return False, f"Authentication failed: {str(e)}"
 
 
     def get_playlist(self):
-        success, message = self.authenticate()
-        if not success:
-            raise Exception(message)
+        if not self.authenticated:
+            success, message = self.authenticate()
+            if not success:
+                raise Exception(message)
         if not self.sp :
             raise Exception("Not Authenticated yet")
         playlists = []
@@ -66,26 +160,17 @@ class SpotifyClient:
             'owner': {'display_name': 'Spotify'}
         })
 
-        offset = 0
-        limit = 50
-        
-        while True:
-            results = self.sp.current_user_playlists(limit=limit, offset=offset)
-            
-            for playlist in results['items']:
-                if playlist['owner']['id'] == self.user_id:  
-                    playlists.append({
-                        'id': playlist['id'],
-                        'name': playlist['name'],
-                        'description': playlist['description'] or '',
-                        'tracks': playlist['tracks'],
-                        'public': playlist['public'],
-                        'owner': playlist['owner']
-                    })
-            
-            if len(results['items']) < limit:
-                break
-            offset += limit
+        for playlist in self._paginate(self.sp.current_user_playlists, 50):
+            if playlist['owner']['id'] == self.user_id:  
+                playlists.append({
+                    'id': playlist['id'],
+                    'name': playlist['name'],
+                    'description': playlist['description'] or '',
+                    'tracks': playlist['tracks'],
+                    'public': playlist['public'],
+                    'owner': playlist['owner'],
+                    'snapshot_id': playlist.get('snapshot_id')
+                })
         
         return playlists
     
@@ -96,47 +181,66 @@ class SpotifyClient:
         except:
             return 0
         
-    def get_playlist_tracks(self, playlist_id):
+    def get_playlist_tracks(self, playlist_id, stream=False):
+        """Return all formatted tracks, or a generator yielding them page by page when stream=True."""
         if not self.sp:
             raise Exception("Not authenticated with Spotify")
         
-        tracks = []
+        tracks = self.iter_playlist_tracks(playlist_id)
+        if stream:
+            return tracks
+        return list(tracks)
+
+    def iter_playlist_tracks(self, playlist_id):
+        if not self.sp:
+            raise Exception("Not authenticated with Spotify")
         
         if playlist_id == 'liked_songs':
-            offset = 0
-            limit = 50
-            
-            while True:
-                results = self.sp.current_user_saved_tracks(limit=limit, offset=offset)
-                
-                for item in results['items']:
-                    track = item['track']
-                    if track and track['name']: 
-                        tracks.append(self._format_track(track))
-                
-                if len(results['items']) < limit:
-                    break
-                offset += limit
-        
+            items = self._paginate(self.sp.current_user_saved_tracks, 50)
         else:
-           
-            offset = 0
-            limit = 100
-            
-            while True:
-                results = self.sp.playlist_tracks(playlist_id, limit=limit, offset=offset)
-                
-                for item in results['items']:
-                    track = item['track']
-                    if track and track['name']:  
-                        tracks.append(self._format_track(track))
-                
-                if len(results['items']) < limit:
-                    break
-                offset += limit
-        
-        return tracks
-    
+            items = self._paginate(partial(self.sp.playlist_tracks, playlist_id), 100)
+
+        for item in items:
+            track = item['track']
+            if track and track['name']:
+                yield self._format_track(track)
+
+    def _paginate(self, fetch, limit):
+        """Yield items of an offset-paged endpoint in order.
+
+        The first page tells us ``total``; the remaining pages are then fetched
+        concurrently (at most SPOTIFY_PAGE_CONCURRENCY at a time) and yielded in
+        offset order.
+        """
+        first = fetch(limit=limit, offset=0)
+        yield from first['items']
+        if len(first['items']) < limit:
+            return
+
+        total = first.get('total') or 0
+        concurrency = max(1, Config.SPOTIFY_PAGE_CONCURRENCY)
+        offsets = deque(range(limit, total, limit))
+        last_offset, last_count = 0, len(first['items'])
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = deque()
+            while offsets or pending:
+                while offsets and len(pending) < concurrency * 2:
+                    offset = offsets.popleft()
+                    pending.append((offset, executor.submit(fetch, limit=limit, offset=offset)))
+                last_offset, future = pending.popleft()
+                items = future.result()['items']
+                last_count = len(items)
+                yield from items
+
+        # The playlist may have grown since the first page was read.
+        offset = last_offset + limit
+        while last_count == limit:
+            items = fetch(limit=limit, offset=offset)['items']
+            last_count = len(items)
+            offset += limit
+            yield from items
+
     def _format_track(self, track):
         artists = [artist['name'] for artist in track['artists']]
         
@@ -1,21 +1,31 @@
+import queue
+import threading
 import time
-import json
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from .spotify_service import SpotifyClient
 from .youtube_service import YouTubeClient
 from utils import log_message
 from . import gai
-import redis
+from .ai_fallback import AIFallbackStage, budget_limits
+from .cache import MatchCache, match_cache
+from .checkpoint import TransferCheckpoint
+from .playlist_writer import PlaylistWriteBuffer
+from .progress import ProgressPublisher
+from .journal import TransferJournal
 from config import Config
+from redis_client import get_redis
 
 class TaskCancelledException(Exception):
     pass
 
 class TransferManager:
-    def __init__(self, session_id:str, progress_callback=None):
+    def __init__(self, session_id:str, progress_callback=None, shared_progress=False, progress_part=None):
         self.spotify_client = SpotifyClient(session_id)
         self.youtube_client = YouTubeClient()
         self.progress_callback = progress_callback
+        self.progress = ProgressPublisher(session_id, shared=shared_progress, part=progress_part)
         self.session_id = session_id
         self.task = None 
         self.transfer_stats = {
@@ -23,7 +33,6 @@ class TransferManager:
             'successful_transfers': 0,
             'failed_transfers': 0,
             'skipped_tracks': 0,
-            'transfer_log': [],
             'playlists': [],  
             'current_playlist_index': 0, 
             'processed_tracks': 0  
@@ -42,10 +51,53 @@ class TransferManager:
     
     def get_spotify_playlists(self):
         return self.spotify_client.get_playlist()
+
+    def resolve_destinations(self, session_id, playlists, options=None):
+        """Map each destination name to its YouTube playlist once, before a transfer fans out.
+
+        Existing playlists are found through the checkpoint or a single
+        library download; missing ones are created now, so Spotify playlists
+        that share a name end up in one YouTube playlist even when their
+        subtasks run concurrently. A failed create maps to None and the
+        subtask falls back to creating it lazily.
+        """
+        options = options or {}
+        checkpoint = TransferCheckpoint(session_id)
+        library_index = None
+        destinations = {}
+        for playlist in playlists:
+            name = playlist['name']
+            if playlist['id'] == 'liked_songs' or name in destinations:
+                continue
+
+            youtube_playlist_id = checkpoint.get_destination(name)
+            if not youtube_playlist_id:
+                if library_index is None:
+                    library_index = self.youtube_client.get_library_playlist_index(session_id)
+                youtube_playlist_id = library_index.get(self.youtube_client.normalize_playlist_title(name))
+            if youtube_playlist_id:
+                destinations[name] = {'youtube_playlist_id': youtube_playlist_id, 'created': False}
+                continue
+
+            try:
+                youtube_playlist_id = self.youtube_client.create_playlist(
+                    session_id, name,
+                    description=playlist.get('description', ''),
+                    privacy_status=options.get('privacy_status', 'PRIVATE')
+                )
+            except Exception as e:
+                self._log(f"Failed to create playlist '{name}' up front: {str(e)}", "WARNING", playlist=name)
+                destinations[name] = None
+                continue
+            checkpoint.record_destination(name, youtube_playlist_id)
+            library_index[self.youtube_client.normalize_playlist_title(name)] = youtube_playlist_id
+            destinations[name] = {'youtube_playlist_id': youtube_playlist_id, 'created': True}
+        return destinations
     
-    def transfer_playlists(self, session_id, selected_playlists, options=None, task=None):
+    def transfer_playlists(self, session_id, selected_playlists, options=None, task=None, destinations=None):
        
         self.task = task
+        self.destinations = destinations or {}
         
         if options is None:
             options = {
@@ -60,220 +112,556 @@ class TransferManager:
             'successful_transfers': 0,
             'failed_transfers': 0,
             'skipped_tracks': 0,
-            'transfer_log': [],
             'playlists': selected_playlists,  
             'current_playlist_index': 0, 
             'processed_tracks': 0  
         }
         
-        self.created_playlists = {}
+        self.library_index = None
+        self.present_videos = {}
+        self.checkpoint = TransferCheckpoint(session_id)
+        self.journal = TransferJournal(session_id)
+        self.playlist_writer = PlaylistWriteBuffer(
+            self.youtube_client, session_id, self._on_playlist_write,
+            on_create=self._on_playlist_created,
+            on_chunk=self._save_written
+        )
         
-        all_tracks_data = []
-        self._update_progress(session_id, "Collecting tracks from playlists")
-        
-        for playlist in selected_playlists:
-            self._check_cancellation(session_id, task)
-            
-            tracks = self.spotify_client.get_playlist_tracks(playlist['id'])
-            if tracks:
-                for track in tracks:
-                    all_tracks_data.append({
-                        'track': track,
-                        'playlist': playlist,
-                        'playlist_id': playlist['id']
-                    })
-        
-        self.transfer_stats['total_tracks'] = len(all_tracks_data)
-        self._update_progress(session_id, f"Found {len(all_tracks_data)} total tracks to transfer")
-        
-        for track_data in all_tracks_data:
-            try:
+        # Playlist listings carry a declared track count; it seeds the live estimate
+        # until each playlist has actually been paged through.
+        self._declared_totals = {p['id']: p.get('tracks', {}).get('total', 0) or 0 for p in selected_playlists}
+        self._collected_totals = {}
+        self._collection_done = False
+        self._refresh_total_estimate()
+        self._update_progress(session_id, "Collecting tracks from playlists", stage="collecting", force=True)
+
+        # Claimed before the collector starts: nothing needs stopping if this fails.
+        max_workers = self._claim_workers(session_id, max(1, min(
+            int(options.get('max_workers', Config.TRANSFER_MAX_WORKERS)),
+            Config.TRANSFER_MAX_WORKERS
+        )))
+
+        track_queue = queue.Queue(maxsize=Config.TRANSFER_QUEUE_SIZE)
+        stop_collecting = threading.Event()
+        collector = threading.Thread(
+            target=self._collect_tracks,
+            args=(selected_playlists, track_queue, stop_collecting),
+            name=f"collect-{session_id}",
+            daemon=True
+        )
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"match-{session_id}")
+        in_flight = deque()
+        self.pending_writes = deque()
+        max_calls, time_budget = budget_limits(options)
+        self.ai_fallback = AIFallbackStage(self._timed, max_calls=max_calls, time_budget=time_budget, session_id=session_id)
+
+        try:
+            collector.start()
+            for track_data in self._iter_collected(track_queue):
                 self._check_cancellation(session_id, task)
-                
-                self.transfer_stats['processed_tracks'] += 1
-                track = track_data['track']
-                playlist = track_data['playlist']
-                
-                self._update_progress(
-                    session_id,
-                    f"Processing track {self.transfer_stats['processed_tracks']}/{self.transfer_stats['total_tracks']}: {track['name']}"
-                )
-                
-                if track_data['playlist_id'] == 'liked_songs':
-                    self._transfer_single_liked_song(session_id, track)
-                else:
-                    self._transfer_single_track_to_playlist(session_id, track, playlist, options)
-                
-                time.sleep(0.1)
-                
-            except TaskCancelledException as e:
-                raise e
-            except Exception as e:
-                self.transfer_stats['failed_transfers'] += 1
-                log_message(f"✗ Error processing {track['name']}: {str(e)}")
 
-        self._update_progress(session_id, "Transfer complete!")
+                try:
+                    if track_data['playlist_id'] != 'liked_songs':
+                        playlist_name = track_data['playlist']['name']
+                        if playlist_name not in self.playlist_writer.targets:
+                            self._open_youtube_playlist(session_id, track_data['playlist'], options)
+
+                    saved = self._checkpointed_match(track_data) or self._present_match(track_data)
+                    if saved is not None:
+                        future = Future()
+                        future.set_result(saved)
+                    else:
+                        future = executor.submit(self._timed, track_data, self._match_track, session_id, track_data['track'])
+                except Exception as e:
+                    # Fails this track only; it is reported in order like any other result.
+                    future = Future()
+                    future.set_exception(e)
+                in_flight.append((track_data, future))
+
+                # Searches overlap, but results are consumed strictly in playlist order.
+                if len(in_flight) >= max_workers * 2:
+                    self._take_next_match(session_id, in_flight, options)
+
+            while in_flight:
+                self._check_cancellation(session_id, task)
+                self._take_next_match(session_id, in_flight, options)
+
+            if self.pending_writes:
+                self._update_progress(session_id, "Resolving remaining tracks with AI fallback", stage="ai_fallback", force=True)
+            self._drain_pending_writes(session_id, options, block=True)
+
+        finally:
+            stop_collecting.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.ai_fallback.shutdown()
+            # Whatever was matched is still written (and counted) when the run ends early.
+            self._flush_playlist_writes()
+            self.checkpoint.flush()
+            self.journal.flush()
+            self._release_workers(session_id, max_workers)
+
+        self.checkpoint.clear([playlist['id'] for playlist in selected_playlists])
+        self._update_progress(session_id, "Transfer complete!", stage="complete", force=True)
         return self._generate_transfer_report()
 
+    def _claim_workers(self, session_id, wanted):
+        """Take up to ``wanted`` match workers from the session's TRANSFER_MAX_WORKERS budget.
+
+        The budget is shared by every subtask of the session through
+        ``workers:{session_id}``; a subtask always gets at least one.
+        """
+        key = f"workers:{session_id}"
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incrby(key, wanted)
+        pipe.expire(key, Config.CELERY_VISIBILITY_TIMEOUT)
+        claimed = pipe.execute()[0]
+        granted = max(1, wanted - max(0, claimed - Config.TRANSFER_MAX_WORKERS))
+        if granted < wanted:
+            get_redis().decrby(key, wanted - granted)
+        return granted
+
+    def _release_workers(self, session_id, count):
+        try:
+            get_redis().decrby(f"workers:{session_id}", count)
+        except Exception as e:
+            self._log(f"Failed to release match workers: {str(e)}", "WARNING")
+
+    _COLLECTION_DONE = object()
+
+    def _collect_tracks(self, selected_playlists, track_queue, stop_event):
+        """Producer: stream Spotify pages into the bounded queue while matching runs."""
+        try:
+            for playlist in selected_playlists:
+                count = 0
+                for track in self.spotify_client.get_playlist_tracks(playlist['id'], stream=True):
+                    item = {'track': track, 'playlist': playlist, 'playlist_id': playlist['id'], 'position': count}
+                    if not self._put_collected(track_queue, item, stop_event):
+                        return
+                    count += 1
+                    self._collected_totals[playlist['id']] = count
+                    self._refresh_total_estimate()
+                self._collected_totals[playlist['id']] = count
+                self._declared_totals[playlist['id']] = count
+                self._refresh_total_estimate()
+            self._collection_done = True
+            self._refresh_total_estimate()
+            self._put_collected(track_queue, self._COLLECTION_DONE, stop_event)
+        except Exception as e:
+            self._put_collected(track_queue, e, stop_event)
+
+    def _put_collected(self, track_queue, item, stop_event):
+        """Blocking put that gives up once the consumer has stopped."""
+        while not stop_event.is_set():
+            try:
+                track_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _iter_collected(self, track_queue):
+        while True:
+            item = track_queue.get()
+            if item is self._COLLECTION_DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def _refresh_total_estimate(self):
+        """Known tracks so far plus the declared counts of playlists not fully paged yet."""
+        estimate = sum(
+            max(declared, self._collected_totals.get(playlist_id, 0))
+            for playlist_id, declared in self._declared_totals.items()
+        )
+        self.transfer_stats['total_tracks'] = estimate
+        self.transfer_stats['total_estimated'] = not self._collection_done
+
+    def _checkpointed_match(self, track_data):
+        """Match saved by an earlier run of this transfer, or None if the track must be searched."""
+        saved = self.checkpoint.get(track_data['playlist_id'], track_data['position'])
+        if not saved or saved.get('s') != track_data['track'].get('spotify_id'):
+            return None
+        return {
+            'videoId': saved['v'] or None,
+            'score': 0,
+            'mode': 'checkpoint',
+            'written': bool(saved.get('w')),
+            'details': {'reason': 'resumed from checkpoint'}
+        }
+
+    def _present_match(self, track_data):
+        """Cached match that already sits in the destination playlist, so no search is needed."""
+        if track_data['playlist_id'] == 'liked_songs':
+            return None
+        present = self.present_videos.get(track_data['playlist']['name'])
+        if not present:
+            return None
+        cached = match_cache.get(track_data['track'].get('spotify_id'))
+        if cached and cached['videoId'] in present:
+            return cached
+        return None
+
+    def _take_next_match(self, session_id, in_flight, options):
+        """Wait for the oldest in-flight search; misses are handed to the AI fallback stage."""
+        track_data, future = in_flight.popleft()
+
+        try:
+            match = future.result()
+        except Exception as e:
+            match = e
+
+        if isinstance(match, dict) and match.get('needs_fallback'):
+            fallback = self.ai_fallback.submit(
+                track_data, self._resolve_with_ai, session_id, track_data['track'], match.get('search_errored', False)
+            )
+            if fallback is None:
+                self._log(f"AI fallback budget exhausted, skipping fallback for: {track_data['track']['name']}", "WARNING", track_data=track_data)
+                match = MatchCache.NOT_FOUND
+            else:
+                match = fallback
+
+        self.pending_writes.append((track_data, match))
+        self._drain_pending_writes(session_id, options)
+
+    def _drain_pending_writes(self, session_id, options, block=False):
+        """Apply results in original order; an unresolved AI lookup holds back everything behind it."""
+        while self.pending_writes:
+            track_data, match = self.pending_writes[0]
+
+            if isinstance(match, Future):
+                if not match.done() and not block:
+                    return
+                if block:
+                    self._check_cancellation(session_id, self.task)
+                try:
+                    match = match.result(timeout=self.ai_fallback.remaining_time())
+                except FutureTimeoutError:
+                    self._log(f"AI fallback time budget exhausted for: {track_data['track']['name']}", "WARNING", track_data=track_data)
+                    match = MatchCache.NOT_FOUND
+                except Exception as e:
+                    match = e
+
+            self.pending_writes.popleft()
+            try:
+                self._apply_match(session_id, track_data, match, options)
+            except TaskCancelledException:
+                raise
+            except Exception as e:
+                if 'outcome' not in track_data:
+                    self.transfer_stats['failed_transfers'] += 1
+                    self._record_outcome(track_data, 'failed')
+                self._log(f"✗ Error processing {track_data['track']['name']}: {str(e)}", "ERROR", track_data=track_data)
+
+    def _flush_playlist_writes(self):
+        try:
+            self.playlist_writer.flush()
+        except Exception as e:
+            self._log(f"Failed to flush pending playlist writes: {str(e)}", "ERROR")
+
+    def _apply_match(self, session_id, track_data, match, options):
+        track = track_data['track']
+        self.transfer_stats['processed_tracks'] += 1
+
+        self._update_progress(
+            session_id,
+            f"Processing track {self.transfer_stats['processed_tracks']}/{self.transfer_stats['total_tracks']}: {track['name']}",
+            current_track=track['name']
+        )
+
+        if isinstance(match, Exception):
+            self.transfer_stats['failed_transfers'] += 1
+            self._record_outcome(track_data, 'failed')
+            self._log(f"✗ Error processing {track['name']}: {str(match)}", "ERROR", track_data=track_data)
+            return
+
+        track_data['match'] = match
+        if match.get('written'):
+            self.transfer_stats['successful_transfers'] += 1
+            self._record_outcome(track_data, 'resumed', match.get('videoId'))
+            self._log(f"Already transferred before restart: {track['name']}", track_data=track_data)
+            return
+        self.checkpoint.record_match(track_data['playlist_id'], track_data['position'], track.get('spotify_id'), match.get('videoId'))
+
+        if track_data['playlist_id'] == 'liked_songs':
+            self._transfer_single_liked_song(session_id, track_data, match)
+        else:
+            self._transfer_single_track_to_playlist(session_id, track_data, options, match)
+
     def _check_cancellation(self, session_id, task):
         """Check if the task should be cancelled"""
         if task is None:
             return
             
-        r = redis.Redis.from_url(Config.REDIS)
-        cancel_flag = r.get(f"cancel_{session_id}")
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.get(f"cancel_{session_id}")
+            pipe.hget(self.progress.key, 'status')
+            cancel_flag, status = pipe.execute()
+        except Exception as e:
+            # A transient Redis error must not end the run; the next check retries.
+            self._log(f"Cancellation check failed: {str(e)}", "WARNING")
+            return
         
-        if cancel_flag and cancel_flag.decode('utf-8') == 'true':
-            r.delete(f"cancel_{session_id}")
-            r.set(f"task_status_{session_id}", "cancelled")
-            r.set(session_id, 0) 
+        # A subtask that starts after the flag expired still sees the cancelled status.
+        if (cancel_flag and cancel_flag.decode('utf-8') == 'true') or status == b'cancelled':
+            # The flag is left to expire so every subtask of the transfer sees it.
+            self.progress.set_status("cancelled", progress=0)
             
-            log_message(f"Transfer cancelled for session {session_id}")
+            self._log(f"Transfer cancelled for session {session_id}")
             
             raise TaskCancelledException("Task cancelled by user")
     
-    def _transfer_single_liked_song(self, session_id, track):
+    def _match_track(self, session_id, track):
+        """Find the YouTube Music video for a Spotify track, consulting the shared match cache first.
+
+        A search miss comes back with ``needs_fallback`` set; the AI fallback
+        runs later in its own stage so it doesn't hold up the main pass.
+        """
+        cached = match_cache.get(track.get('spotify_id'))
+        if cached is not None:
+            return cached
+
+        youtube_track, similarity, errored = self.youtube_client.search_song(
+            "reg",
+            session_id,
+            track['name'],
+            ', '.join(track['artists']),
+            track['album'],
+            artists=track['artists'],
+            duration_ms=track.get('duration_ms')
+        )
+
+        if youtube_track:
+            match_cache.set_match(track.get('spotify_id'), youtube_track['videoId'], similarity, "reg")
+            return {'videoId': youtube_track['videoId'], 'score': similarity, 'mode': "reg",
+                    'details': youtube_track.get('match_details')}
+
+        return dict(MatchCache.NOT_FOUND, needs_fallback=True, search_errored=errored)
+
+    def _resolve_with_ai(self, session_id, track, search_errored=False):
+        """AI fallback for a search miss.
+
+        The miss is cached for every user only when it is conclusive: no
+        search query failed upstream and the AI lookup finished.
+        """
+        artists = ', '.join(track['artists'])
+        self._log(f"Initial search failed, trying AI fallback for: {track['name']}")
         try:
-            youtube_track, similarity = self.youtube_client.search_song(
+            ai_song_title = gai.get_song(track['name'], artists)
+        except gai.AITimeoutError as e:
+            # Only this transfer treats it as a miss; nothing is cached for other users.
+            self._log(f"{str(e)}; leaving {track['name']} unmatched", "WARNING")
+            return MatchCache.NOT_FOUND
+
+        youtube_track, similarity, ai_search_errored = None, 0, False
+        if ai_song_title != gai.NO_RESULT:
+            youtube_track, similarity, ai_search_errored = self.youtube_client.search_song(
+                "ai",
                 session_id,
-                track['name'], 
-                ', '.join(track['artists']),
-                track['album']
+                ai_song_title,
+                artists,
+                track['album'],
+                artists=track['artists'],
+                duration_ms=track.get('duration_ms')
             )
-            
-            if youtube_track:
-                if self.youtube_client.add_song_to_liked(session_id, youtube_track['videoId']):
+
+        if youtube_track:
+            match_cache.set_match(track.get('spotify_id'), youtube_track['videoId'], similarity, "ai")
+            return {'videoId': youtube_track['videoId'], 'score': similarity, 'mode': "ai",
+                    'details': dict(youtube_track.get('match_details') or {}, ai_title=ai_song_title)}
+
+        if search_errored or ai_search_errored:
+            self._log(f"Search errors left {track['name']} unresolved; not caching the miss", "WARNING")
+        else:
+            match_cache.set_not_found(track.get('spotify_id'))
+        return MatchCache.NOT_FOUND
+
+    def _transfer_single_liked_song(self, session_id, track_data, match):
+        track = track_data['track']
+        try:
+            if match['videoId']:
+                if self.youtube_client.add_song_to_liked(session_id, match['videoId']):
                     self.transfer_stats['successful_transfers'] += 1
-                    log_message(f"✓ Liked: {track['name']} by {', '.join(track['artists'])}")
+                    self.checkpoint.record_written(track_data['playlist_id'], track_data['position'], track.get('spotify_id'), match['videoId'])
+                    self._record_outcome(track_data, 'added', match['videoId'])
+                    self._log(f"✓ Liked: {track['name']} by {', '.join(track['artists'])}", track_data=track_data)
                 else:
                     self.transfer_stats['failed_transfers'] += 1
-                    log_message(f"✗ Failed to like: {track['name']}")
+                    self._record_outcome(track_data, 'failed', match['videoId'])
+                    self._log(f"✗ Failed to like: {track['name']}", "WARNING", track_data=track_data)
             else:
                 self.transfer_stats['failed_transfers'] += 1
-                log_message(f"✗ Not found: {track['name']} by {', '.join(track['artists'])}")
+                self._record_outcome(track_data, 'not_found')
+                self._log(f"✗ Not found: {track['name']} by {', '.join(track['artists'])}", "WARNING", track_data=track_data)
                 
         except Exception as e:
             self.transfer_stats['failed_transfers'] += 1
-            log_message(f"✗ Error processing liked song {track['name']}: {str(e)}")
+            self._record_outcome(track_data, 'failed')
+            self._log(f"✗ Error processing liked song {track['name']}: {str(e)}", "ERROR", track_data=track_data)
 
-    def _transfer_single_track_to_playlist(self, session_id, track, playlist, options):
-        
+    def _transfer_single_track_to_playlist(self, session_id, track_data, options, match):
+        track = track_data['track']
+        playlist = track_data['playlist']
         try:
             playlist_name = playlist['name']
             
-            if playlist_name not in self.created_playlists:
-                youtube_playlist_id = self._get_or_create_youtube_playlist(session_id, playlist, options)
-                if not youtube_playlist_id:
-                    self.transfer_stats['failed_transfers'] += 1
-                    return
-                self.created_playlists[playlist_name] = youtube_playlist_id
-            else:
-                youtube_playlist_id = self.created_playlists[playlist_name]
-            
-            youtube_track, similarity = self.youtube_client.search_song(
-                "reg",
-                session_id,
-                track['name'],
-                ', '.join(track['artists']),
-                track['album']
-            )
+            if playlist_name not in self.playlist_writer.targets:
+                self._open_youtube_playlist(session_id, playlist, options)
 
-            if not youtube_track:
-                log_message(f"Initial search failed, trying AI fallback for: {track['name']}")
-                ai_song_title = gai.get_song(track['name'], ', '.join(track['artists']))
-                
-                if ai_song_title != "No result found":
-                    youtube_track, similarity = self.youtube_client.search_song(
-                        "ai",
-                        session_id,
-                        ai_song_title,
-                        ', '.join(track['artists']),
-                        track['album']
-                    )
-
-            if youtube_track:
-                if self.youtube_client.add_song_to_playlist(session_id, youtube_playlist_id, youtube_track['videoId']):
-                    self.transfer_stats['successful_transfers'] += 1
-                    log_message(f"Added: {track['name']} by {', '.join(track['artists'])}")
-                else:
-                    self.transfer_stats['failed_transfers'] += 1
-                    log_message(f"Failed to add: {track['name']}")
+            present = self.present_videos.setdefault(playlist_name, set())
+            if match['videoId'] and match['videoId'] in present:
+                self.transfer_stats['skipped_tracks'] += 1
+                self.checkpoint.record_written(track_data['playlist_id'], track_data['position'], track.get('spotify_id'), match['videoId'])
+                self._record_outcome(track_data, 'skipped', match['videoId'])
+                self._log(f"Already in playlist, skipped: {track['name']}", track_data=track_data)
+            elif match['videoId']:
+                present.add(match['videoId'])
+                self.playlist_writer.add(playlist_name, track_data, match['videoId'])
             else:
                 self.transfer_stats['failed_transfers'] += 1
-                log_message(f"Not found: {track['name']} by {', '.join(track['artists'])}")
+                self._record_outcome(track_data, 'not_found')
+                self._log(f"Not found: {track['name']} by {', '.join(track['artists'])}", "WARNING", track_data=track_data)
                 
         except Exception as e:
             self.transfer_stats['failed_transfers'] += 1
-            log_message(f"✗ Error processing track {track['name']}: {str(e)}")
+            self._record_outcome(track_data, 'failed')
+            self._log(f"✗ Error processing track {track['name']}: {str(e)}", "ERROR", track_data=track_data)
+
+    def _on_playlist_write(self, track_data, video_id, success):
+        track = track_data['track']
+        if success:
+            self.transfer_stats['successful_transfers'] += 1
+            self.checkpoint.record_written(track_data['playlist_id'], track_data['position'], track.get('spotify_id'), video_id)
+            self._record_outcome(track_data, 'added', video_id)
+            self._log(f"Added: {track['name']} by {', '.join(track['artists'])}", track_data=track_data)
+        else:
+            self.transfer_stats['failed_transfers'] += 1
+            self._record_outcome(track_data, 'failed', video_id)
+            self._log(f"Failed to add: {track['name']}", "WARNING", track_data=track_data)
+
+    def _save_written(self):
+        """Persist "written" right after each chunk so a killed worker doesn't add it again."""
+        try:
+            self.checkpoint.flush()
+        except Exception as e:
+            self._log(f"Failed to save checkpoint: {str(e)}", "WARNING")
+
+    def _log(self, message, level="INFO", track_data=None, playlist=None):
+        if track_data is not None:
+            playlist = track_data['playlist']['name']
+        log_message(message, level, session_id=self.session_id, playlist=playlist)
+
+    def _record_outcome(self, track_data, outcome, video_id=None):
+        track_data['outcome'] = outcome
+        track = track_data['track']
+        match = track_data.get('match') or {}
+        self.progress.record_track(track_data['playlist']['name'], track['name'], outcome, video_id)
+        self.journal.record({
+            'spotify_id': track.get('spotify_id'),
+            'track': track['name'],
+            'playlist': track_data['playlist']['name'],
+            'videoId': video_id or match.get('videoId'),
+            'score': round(match['score'], 3) if match.get('score') is not None else None,
+            'mode': match.get('mode'),
+            'outcome': outcome,
+            'latency_ms': track_data.get('latency_ms', 0),
+            'reason': (match.get('details') or {}).get('reason')
+        })
 
-    def _get_or_create_youtube_playlist(self, session_id, playlist, options):
-        """Get existing or create new YouTube playlist"""
+    @staticmethod
+    def _timed(track_data, func, *args):
+        """Run a match/fallback lookup, adding its wall time to the track's journal latency."""
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            track_data['latency_ms'] = track_data.get('latency_ms', 0) + int((time.monotonic() - started) * 1000)
+
+    def _on_playlist_created(self, name, youtube_playlist_id):
+        self.checkpoint.record_destination(name, youtube_playlist_id)
+        if self.library_index is not None:
+            self.library_index[self.youtube_client.normalize_playlist_title(name)] = youtube_playlist_id
+
+    def _open_youtube_playlist(self, session_id, playlist, options):
+        """Register the destination playlist with the write buffer, reusing an existing one by name.
+
+        New playlists are created lazily by the write buffer together with their first chunk.
+        """
         playlist_name = playlist['name']
+        destination = self.destinations.get(playlist_name) or {}
         
-        exists, existing_id = self.youtube_client.playlist_exists(session_id, playlist_name)
+        existing_id = destination.get('youtube_playlist_id') or self.checkpoint.get_destination(playlist_name)
+        if not existing_id:
+            if self.library_index is None:
+                self.library_index = self.youtube_client.get_library_playlist_index(session_id)
+            existing_id = self.library_index.get(self.youtube_client.normalize_playlist_title(playlist_name))
         
-        if exists and not options.get('overwrite_existing', False):
-            log_message(f"Playlist '{playlist_name}' already exists. Using existing.")
-            return existing_id
+        if destination.get('created') and self._first_run(playlist):
+            self.present_videos[playlist_name] = set()
+        elif existing_id:
+            self._log(f"Playlist '{playlist_name}' already exists. Using existing.", playlist=playlist_name)
+            self.present_videos[playlist_name] = self.youtube_client.get_playlist_video_ids(session_id, existing_id)
         
-        try:
-            if exists and options.get('overwrite_existing', False):
-                return existing_id
-            else:
-                return self.youtube_client.create_playlist(
-                    session_id=session_id,
-                    name=playlist_name,
-                    description=playlist.get('description', ''),
-                    privacy_status=options.get('privacy_status', 'PRIVATE')
-                )
-        except Exception as e:
-            log_message(f"Failed to create playlist '{playlist_name}': {str(e)}")
-            return None
-    
-    def _update_progress(self, session_id, message):
-        print("update")
-        r = redis.Redis.from_url(Config.REDIS)
+        return self.playlist_writer.open(
+            playlist_name,
+            playlist_name,
+            youtube_playlist_id=existing_id,
+            description=playlist.get('description', ''),
+            privacy_status=options.get('privacy_status', 'PRIVATE')
+        )
     
+    def _first_run(self, playlist):
+        """Whether this is the first attempt at the playlist, so nothing of ours can be in it yet.
+
+        A broker redelivery carries the same ``created`` destination as the
+        first delivery, so redelivered tasks and playlists with checkpoint
+        state always load the playlist contents.
+        """
+        request = getattr(self.task, 'request', None)
+        delivery_info = getattr(request, 'delivery_info', None) or {}
+        if delivery_info.get('redelivered'):
+            return False
+        return not self.checkpoint.has_state(playlist['id'])
+
+    def _update_progress(self, session_id, message, stage="transferring", current_track="", force=False):
         total_tracks = self.transfer_stats.get('total_tracks', 0)
         processed_tracks = self.transfer_stats.get('processed_tracks', 0)
         
-        print(f"DEBUG: total_tracks={total_tracks}, processed_tracks={processed_tracks}")
-        
-        if total_tracks > 0:
-            total_progress = (processed_tracks / total_tracks) * 100
-        else:
-            total_progress = 0.0
-            
-        total_progress = round(total_progress, 2)
-        total_progress = min(total_progress, 100)
-        
-        
-        print(f"DEBUG: Setting progress to {total_progress}% in Redis")
-        
-       
-        r.set(session_id, total_progress)
+        try:
+            total_progress = self.progress.update(
+                stage,
+                processed=processed_tracks,
+                total=total_tracks,
+                successful=self.transfer_stats.get('successful_transfers', 0),
+                failed=self.transfer_stats.get('failed_transfers', 0),
+                current_track=current_track,
+                estimated=self.transfer_stats.get('total_estimated', False),
+                force=force
+            )
+        except Exception as e:
+            # Progress is best effort; a missed update is caught up by the next one.
+            self._log(f"Progress update failed: {str(e)}", "WARNING")
+            total_progress = round(min((processed_tracks / total_tracks) * 100, 100), 2) if total_tracks else 0.0
         
         message = f"{message} (Overall Progress: {total_progress}%)"
 
         if self.progress_callback:
             self.progress_callback(message)
         else:
-            print(f"Progress: {message}")
+            self._log(f"Progress: {message}", "DEBUG")
     
     def _generate_transfer_report(self):
-        report = {
+        """Summary only; per-track detail lives in the session's journal."""
+        return {
             'timestamp': datetime.now().isoformat(),
             'summary': {
                 'total_tracks': self.transfer_stats['total_tracks'],
                 'successful_transfers': self.transfer_stats['successful_transfers'],
                 'failed_transfers': self.transfer_stats['failed_transfers'],
+                'skipped_tracks': self.transfer_stats['skipped_tracks'],
                 'success_rate': (self.transfer_stats['successful_transfers'] / 
                                max(self.transfer_stats['total_tracks'], 1)) * 100
             },
-            'details': self.transfer_stats['transfer_log']
+            'journal_entries': self.journal.entries
         }
-        
-        with open(f"transfer_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", 'w') as f:
-            json.dump(report, f, indent=2)
-        
-        return report
@@ -1,28 +1,77 @@
 from ytmusicapi import YTMusic
-import os
-from fuzzywuzzy import fuzz
+import re
 from config import Config
+from utils import log_message
+from .cache import TTLCache
+from .scoring import scorer
+from .rate_limit import RateLimitedClient
+from .session_store import get_session_store
+
+class YTMusicRegistry:
+    """Per-process cache of authenticated YTMusic clients keyed by session.
+
+    An entry stays valid while the session's stored headers are unchanged
+    (same ``updated_at``) and until it expires or is invalidated after an auth error, so the live probe in
+    ``YouTubeClient.authenticate`` runs once per session instead of once per
+    ``TransferManager``.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._cache = TTLCache(
+            Config.YTMUSIC_REGISTRY_SIZE if maxsize is None else maxsize,
+            Config.YTMUSIC_REGISTRY_TTL if ttl is None else ttl
+        )
+
+    def get(self, session_id, version):
+        entry = self._cache.get(session_id)
+        if entry is None:
+            return None
+        if entry['version'] != version:
+            self._cache.delete(session_id)
+            return None
+        return entry['ytmusic']
+
+    def put(self, session_id, version, ytmusic):
+        self._cache.set(session_id, {'ytmusic': ytmusic, 'version': version})
+
+    def invalidate(self, session_id):
+        self._cache.delete(session_id)
+
+
+ytmusic_registry = YTMusicRegistry()
+
 
 class YouTubeClient:
     def __init__(self):
         self.ytmusic = None
         self.session_id = None
-    
+
+    CREDENTIALS_KIND = 'ytmusic'
+
     def authenticate(self, session_id):
         try:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            paths = os.path.join(base_dir, f"header{session_id}.json")
+            stored = get_session_store().get(session_id, self.CREDENTIALS_KIND)
             
-            if not os.path.exists(paths):
-                return False, "Headers file not found."
+            if not stored:
+                return False, "YouTube Music headers not found."
+
+            cached = ytmusic_registry.get(session_id, stored['updated_at'])
+            if cached is not None:
+                self.ytmusic = RateLimitedClient(cached, 'ytmusic', session_id)
+                self.session_id = session_id
+                return True, "Successfully authenticated with YouTube Music"
             
-            self.ytmusic = YTMusic(paths)
-            self.session_id = session_id
+            ytmusic = YTMusic(auth=stored['headers'])
+            limited = RateLimitedClient(ytmusic, 'ytmusic', session_id)
             
             # Quick test to ensure cookies are valid
-            playlists = self.ytmusic.get_library_playlists(limit=1)
+            playlists = limited.get_library_playlists(limit=1)
             if playlists is None:
                 return False, "Authentication successful but no playlists returned. Your cookies may be expired."
+
+            self.ytmusic = limited
+            self.session_id = session_id
+            ytmusic_registry.put(session_id, stored['updated_at'], ytmusic)
             
             return True, "Successfully authenticated with YouTube Music"
         except Exception as e:
@@ -35,52 +84,141 @@ class YouTubeClient:
             if not success:
                 raise Exception(msg)
 
-    def create_playlist(self, session_id, name, description="", privacy_status="PRIVATE"):
+    def _handle_error(self, session_id, error):
+        """Drop the cached client after an auth failure so the next call re-probes."""
+        message = str(error).lower()
+        if any(marker in message for marker in ('401', '403', 'unauthorized', 'sign in', 'not logged in')):
+            ytmusic_registry.invalidate(session_id)
+            self.session_id = None
+
+    def create_playlist(self, session_id, name, description="", privacy_status="PRIVATE", video_ids=None):
         self._ensure_authenticated(session_id)
         try:
-            return self.ytmusic.create_playlist(
+            playlist_id = self.ytmusic.create_playlist(
                 title=name,
                 description=description,
-                privacy_status=privacy_status
+                privacy_status=privacy_status,
+                video_ids=video_ids
             )
         except Exception as e:
+            self._handle_error(session_id, e)
             raise Exception(f"Failed to create playlist: {str(e)}")
+        if not isinstance(playlist_id, str):
+            raise Exception(f"Failed to create playlist: {playlist_id}")
+        return playlist_id
+
+    _FEATURING = re.compile(r"\s*[\(\[]?\s*\b(?:feat\.?|ft\.?|featuring)\s.*$", re.IGNORECASE)
+
+    @classmethod
+    def _plan_queries(cls, track_name, artist_name, album_name=None, artists=None):
+        """Ordered, de-duplicated query forms, cheapest and most specific first."""
+        artists = artists or [a.strip() for a in artist_name.split(',') if a.strip()] or [artist_name]
+        primary = artists[0]
+        all_artists = ' '.join(artists)
+        bare_title = cls._FEATURING.sub('', track_name).strip(' -')
+
+        queries = [
+            f"{track_name} {primary}",
+            f"{track_name} {all_artists}",
+            f"{track_name} {all_artists} {album_name}" if album_name else None,
+            f"{bare_title} {primary}" if bare_title and bare_title != track_name else None,
+        ]
+        planned = []
+        for query in queries:
+            if query and query not in planned:
+                planned.append(query)
+        return planned
 
-    def search_song(self, mode , session_id, track_name, artist_name, album_name=None):
+    def search_song(self, mode , session_id, track_name, artist_name, album_name=None, artists=None, duration_ms=None):
+        """Try the planned queries in order, stopping once a candidate clears SEARCH_EARLY_EXIT_SCORE.
+
+        With ``duration_ms`` candidates outside the duration tolerance are dropped
+        before scoring and duration closeness is blended into the ranking. The
+        returned match carries ``match_details`` explaining why it was picked.
+
+        Returns ``(match, score, errored)``; ``errored`` is set when any query
+        failed upstream, so a miss may only mean YouTube Music was unavailable.
+        """
         self._ensure_authenticated(session_id)
-        query = f"{track_name} {artist_name}"
-        if album_name:
-            query += f" {album_name}"
-        
-        try:
-            threshold = 0
-            if(mode=="ai"): 
-                threshold = Config.SIMILARITY_AI
-            else:
-                threshold = Config.SIMILARITY_THRESHOLD
-            search_results = self.ytmusic.search(query, filter="songs", limit=Config.MAX_SEARCH_RESULTS)
-            best_match, best_score = None, 0
-            for result in search_results:
-                if result.get('videoId'):
-                    score = self._calculate_similarity(
-                        track_name, artist_name,
-                        result.get('title', ''),
-                        result.get('artists', [{}])[0].get('name', '') if result.get('artists') else ''
-                    )
-                    if score > best_score and score >= threshold:
-                        best_score, best_match = score, result
-            return best_match, best_score
-        except Exception as e:
-            print(f"Search error for '{query}': {str(e)}")
-            return None, 0
+        threshold = 0
+        if(mode=="ai"): 
+            threshold = Config.SIMILARITY_AI
+        else:
+            threshold = Config.SIMILARITY_THRESHOLD
+
+        target_seconds = duration_ms / 1000.0 if duration_ms else None
+        norm_title, norm_artist = scorer.normalize(track_name, artist_name)
+        best_match, best_score, best_rank = None, 0, -1
+        seen = set()
+        considered, pruned = 0, 0
+        errored = False
+        for query in self._plan_queries(track_name, artist_name, album_name, artists):
+            try:
+                search_results = self.ytmusic.search(query, filter="songs", limit=Config.MAX_SEARCH_RESULTS)
+            except Exception as e:
+                self._handle_error(session_id, e)
+                log_message(f"Search error for '{query}': {str(e)}", "WARNING", session_id=session_id)
+                errored = True
+                continue
+
+            candidates, fits = [], []
+            for result in search_results or []:
+                video_id = result.get('videoId')
+                if not video_id or video_id in seen:
+                    continue
+                seen.add(video_id)
+                considered += 1
+                delta, closeness = scorer.duration_fit(target_seconds, scorer.candidate_duration(result))
+                if closeness == 0.0:
+                    pruned += 1
+                    continue
+                candidates.append(result)
+                fits.append((delta, closeness))
+
+            scores = scorer.score_normalized(
+                norm_title, norm_artist,
+                [(result.get('title', ''), scorer.candidate_artist(result)) for result in candidates]
+            )
+            for result, score, (delta, closeness) in zip(candidates, scores, fits):
+                rank = scorer.rank(score, closeness)
+                if score >= threshold and rank > best_rank:
+                    best_rank, best_score, best_match = rank, score, result
+                    result['match_details'] = {
+                        'query': query,
+                        'similarity': round(score, 3),
+                        'duration_delta_s': round(delta, 1) if delta is not None else None,
+                        'rank_score': round(rank, 3)
+                    }
+
+            if best_score >= Config.SEARCH_EARLY_EXIT_SCORE:
+                break
+
+        if best_match:
+            details = best_match['match_details']
+            details['candidates_considered'] = considered
+            details['pruned_by_duration'] = pruned
+            reason = f"similarity {details['similarity']} >= {threshold}"
+            if details['duration_delta_s'] is not None:
+                reason += f", duration off by {details['duration_delta_s']}s"
+            details['reason'] = f"best rank {details['rank_score']} via '{details['query']}' ({reason})"
+
+        return best_match, best_score, errored
 
     def add_song_to_playlist(self, session_id, playlist_id, video_id):
+        return self.add_songs_to_playlist(session_id, playlist_id, [video_id])
+
+    def add_songs_to_playlist(self, session_id, playlist_id, video_ids):
+        """Add several videos in one request; False means the whole batch was rejected."""
         self._ensure_authenticated(session_id)
         try:
-            self.ytmusic.add_playlist_items(playlist_id, [video_id])
+            response = self.ytmusic.add_playlist_items(playlist_id, list(video_ids))
+            if isinstance(response, dict) and response.get('status', 'STATUS_SUCCEEDED') != 'STATUS_SUCCEEDED':
+                log_message(f"Failed to add songs: {response.get('status')}", "WARNING", session_id=session_id)
+                return False
             return True
         except Exception as e:
-            print(f"Failed to add song: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to add songs: {str(e)}", "WARNING", session_id=session_id)
             return False
 
     def add_song_to_liked(self, session_id, video_id):
@@ -89,7 +227,8 @@ class YouTubeClient:
             self.ytmusic.rate_song(video_id, 'LIKE')
             return True
         except Exception as e:
-            print(f"Failed to like song: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to like song: {str(e)}", "WARNING", session_id=session_id)
             return False
 
     def get_library_playlists(self, session_id):
@@ -97,7 +236,8 @@ class YouTubeClient:
         try:
             return self.ytmusic.get_library_playlists(limit=None)
         except Exception as e:
-            print(f"Failed to get playlists: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to get playlists: {str(e)}", "WARNING", session_id=session_id)
             return []
 
     def playlist_exists(self, session_id, playlist_name):
@@ -107,13 +247,38 @@ class YouTubeClient:
                 return True, playlist.get('playlistId')
         return False, None
 
+    @staticmethod
+    def normalize_playlist_title(title):
+        return (title or '').strip().casefold()
+
+    def get_library_playlist_index(self, session_id):
+        """Fetch the library once and map normalized playlist titles to playlistIds."""
+        index = {}
+        for playlist in self.get_library_playlists(session_id):
+            key = self.normalize_playlist_title(playlist.get('title'))
+            if key and playlist.get('playlistId'):
+                index.setdefault(key, playlist['playlistId'])
+        return index
+
+    def get_playlist_video_ids(self, session_id, playlist_id):
+        """All videoIds currently in a playlist, fetched with a single get_playlist call."""
+        self._ensure_authenticated(session_id)
+        try:
+            playlist = self.ytmusic.get_playlist(playlist_id, limit=None)
+            return {t['videoId'] for t in playlist.get('tracks', []) if t.get('videoId')}
+        except Exception as e:
+            self._handle_error(session_id, e)
+            log_message(f"Failed to get playlist contents: {str(e)}", "WARNING", session_id=session_id)
+            return set()
+
     def get_playlist_tracks_count(self, session_id, playlist_id):
         self._ensure_authenticated(session_id)
         try:
             playlist = self.ytmusic.get_playlist(playlist_id, limit=None)
             return len(playlist.get('tracks', []))
         except Exception as e:
-            print(f"Failed to get playlist track count: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to get playlist track count: {str(e)}", "WARNING", session_id=session_id)
             return 0
 
     def delete_playlist(self, session_id, playlist_id):
@@ -122,7 +287,8 @@ class YouTubeClient:
             self.ytmusic.delete_playlist(playlist_id)
             return True
         except Exception as e:
-            print(f"Failed to delete playlist: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to delete playlist: {str(e)}", "WARNING", session_id=session_id)
             return False
 
     def remove_song_from_playlist(self, session_id, playlist_id, video_id, set_video_id=None):
@@ -131,7 +297,8 @@ class YouTubeClient:
             self.ytmusic.remove_playlist_items(playlist_id, [{'videoId': video_id, 'setVideoId': set_video_id}])
             return True
         except Exception as e:
-            print(f"Failed to remove song: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to remove song: {str(e)}", "WARNING", session_id=session_id)
             return False
 
     def unlike_song(self, session_id, video_id):
@@ -140,7 +307,8 @@ class YouTubeClient:
             self.ytmusic.rate_song(video_id, 'INDIFFERENT')
             return True
         except Exception as e:
-            print(f"Failed to unlike song: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to unlike song: {str(e)}", "WARNING", session_id=session_id)
             return False
 
     def get_liked_songs(self, session_id, limit=None):
@@ -149,7 +317,8 @@ class YouTubeClient:
             liked_songs = self.ytmusic.get_liked_songs(limit=limit)
             return liked_songs.get('tracks', [])
         except Exception as e:
-            print(f"Failed to get liked songs: {str(e)}")
+            self._handle_error(session_id, e)
+            log_message(f"Failed to get liked songs: {str(e)}", "WARNING", session_id=session_id)
             return []
 
     def search_multiple_queries(self, session_id, queries, filter_type="songs"):
@@ -161,13 +330,9 @@ class YouTubeClient:
                 if search_results:
                     results.extend(search_results)
             except Exception as e:
-                print(f"Search error for '{query}': {str(e)}")
+                self._handle_error(session_id, e)
+                log_message(f"Search error for '{query}': {str(e)}", "WARNING", session_id=session_id)
         return results
 
     def _calculate_similarity(self, spotify_title, spotify_artist, youtube_title, youtube_artist):
-        spotify_title, spotify_artist = spotify_title.lower().strip(), spotify_artist.lower().strip()
-        youtube_title, youtube_artist = youtube_title.lower().strip(), youtube_artist.lower().strip()
-        
-        title_similarity = fuzz.ratio(spotify_title, youtube_title) / 100.0
-        artist_similarity = fuzz.ratio(spotify_artist, youtube_artist) / 100.0
-        return (title_similarity * 0.7) + (artist_similarity * 0.3)
+        return scorer.score_candidates(spotify_title, spotify_artist, [(youtube_title, youtube_artist)])[0]
@@ -1,19 +1,32 @@
 import os
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
 from config import Config
+from log_sink import log_sink
 
-def log_message(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {level}: {message}"
-    
-    print(log_entry)
-    
-    try:
-        with open(Config.TRANSFER_LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_entry + '\n')
-    except Exception as e:
-        print(f"Failed to write to log file: {e}")
+_blocking_executor = ThreadPoolExecutor(max_workers=Config.API_THREADPOOL_SIZE, thread_name_prefix="api-blocking")
+
+async def run_blocking(func, *args, timeout=None, **kwargs):
+    """Run a blocking call on the API's sized threadpool so the event loop stays free.
+
+    Raises asyncio.TimeoutError after ``timeout`` seconds (API_BLOCKING_TIMEOUT
+    by default); the worker thread is left to finish on its own.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_blocking_executor, partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, Config.API_BLOCKING_TIMEOUT if timeout is None else timeout)
+
+def log_message(message, level="INFO", session_id=None, playlist=None):
+    """Queue a log record for the background sink; never touches the file or stdout inline.
+
+    Records are tagged with ``session_id``/``playlist`` and land in the
+    per-process rotating log, the session's Redis log stream and, from
+    LOG_CONSOLE_LEVEL up, stderr.
+    """
+    log_sink.log(message, level, session_id=session_id, playlist=playlist)
 
 def format_duration(duration_ms):
     if not duration_ms:
@@ -25,6 +38,20 @@ def format_duration(duration_ms):
     
     return f"{minutes}:{seconds:02d}"
 
+def parse_duration(duration):
+    """Parse a YouTube Music duration ("3:45", "1:02:03") into seconds; None if unknown."""
+    if duration is None:
+        return None
+    if isinstance(duration, (int, float)):
+        return int(duration)
+    try:
+        seconds = 0
+        for part in str(duration).strip().split(':'):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return None
+
 def sanitize_filename(filename):
     invalid_chars = '<>:"/\\|?*'
     for char in invalid_chars: